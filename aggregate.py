@@ -0,0 +1,143 @@
+# Synthetic Traffic Generator, Version 0.1
+# (c) 2015-2015, Inria, Palaiseau, France
+# Licensed under the GNU GPL, Version 3. For more details see LICENSE
+# Author: Eduardo Mucelli Rezende Oliveira (edumucelli@gmail.com)
+
+import sys
+from multiprocessing import Pool, cpu_count
+from os import makedirs, path
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+import generator
+from generator import IATSampler, User, USER_CLASSES, user_random_state
+from log import debug, start_logging, worker_logging
+
+# Width of the bins of the load time series, in seconds
+BIN_SECONDS = 60
+# Users generated together by a worker, only the traffic of a chunk is in memory at once
+USERS_PER_AGGREGATE_CHUNK = 10000
+LOAD_FILE = "load.npz"
+
+
+class LoadHistogram(object):
+    """Offered load of a day per user class, as the number of requests and the volume in KiloBytes of each bin of
+    bin_seconds seconds from midnight. Rows follow USER_CLASSES. Timestamps are binned once rounded to the microsecond,
+    as in the written traffic, thus the histogram of a written trace is the same."""
+
+    def __init__(self, bin_seconds=BIN_SECONDS):
+        self.bin_seconds = bin_seconds
+        self.number_of_bins = -(-generator.ONE_DAY // bin_seconds)
+        self.requests = np.zeros((len(USER_CLASSES), self.number_of_bins), dtype=np.int64)
+        self.volume = np.zeros((len(USER_CLASSES), self.number_of_bins), dtype=np.float64)
+
+    def add(self, traffic: generator.SyntheticTraffic) -> None:
+        microseconds = np.rint(np.asarray(traffic.timestamp, dtype=float) * 1e6).astype(np.int64)
+        bins = np.minimum(microseconds // (self.bin_seconds * 10 ** 6), self.number_of_bins - 1)
+        cells = traffic.klass.astype(np.int64) * self.number_of_bins + bins
+        size = self.requests.size
+        self.requests += np.bincount(cells, minlength=size).reshape(self.requests.shape)
+        self.volume += np.bincount(cells, weights=traffic.volume, minlength=size).reshape(self.volume.shape)
+
+    def merge(self, other: "LoadHistogram") -> None:
+        if other.bin_seconds != self.bin_seconds:
+            raise Exception(
+                "Histograms of %d and %d seconds bins cannot be merged" % (self.bin_seconds, other.bin_seconds)
+            )
+        self.requests += other.requests
+        self.volume += other.volume
+
+    def save(self, file_path) -> None:
+        np.savez(
+            file_path,
+            bin_seconds=self.bin_seconds,
+            user_classes=np.array(USER_CLASSES),
+            requests=self.requests,
+            volume=self.volume,
+        )
+
+    @classmethod
+    def load(cls, file_path) -> "LoadHistogram":
+        with np.load(file_path) as arrays:
+            histogram = cls(int(arrays["bin_seconds"]))
+            histogram.requests[...] = arrays["requests"]
+            histogram.volume[...] = arrays["volume"]
+        return histogram
+
+
+def _aggregate_chunk(task) -> Tuple[LoadHistogram, Dict[str, int]]:
+    # Runs in a worker process, generates the users of a chunk as generate_synthethic_users_and_traffic does, every
+    # one from its own random state, and only keeps their histogram
+    chunk, uids, klasses, options = task
+    iat_sampler = IATSampler(options["iat_sampling_method"])
+    traffic = []
+    for uid, code in zip(uids.tolist(), klasses.tolist()):
+        user = User(uid, USER_CLASSES[code], None, iat_sampler, options["sampling_backend"])
+        user.generate_synthetic_traffic(user_random_state(uid, options["random_seed"]))
+        traffic.append(user.traffic())
+    histogram = LoadHistogram(options["bin_seconds"])
+    if traffic:
+        histogram.add(generator.SyntheticTraffic(*(np.concatenate(column) for column in zip(*traffic))))
+    return histogram, iat_sampler.counters()
+
+
+def _chunks(uids, klasses, users_per_chunk, options) -> Iterator[Tuple[int, np.ndarray, np.ndarray, Dict]]:
+    for chunk, start in enumerate(range(0, uids.size, users_per_chunk)):
+        yield chunk, uids[start : start + users_per_chunk], klasses[start : start + users_per_chunk], options
+
+
+def aggregate_load(
+    number_of_users=generator.NUMBER_OF_SYNTHETIC_USERS,
+    bin_seconds=BIN_SECONDS,
+    number_of_workers: Optional[int] = None,
+    users_per_chunk=USERS_PER_AGGREGATE_CHUNK,
+    random_seed=generator.RANDOM_SEED,
+    iat_sampling_method="rejection",
+    sampling_backend=generator.SAMPLING_BACKEND,
+    exact_class_proportions=False,
+) -> LoadHistogram:
+    """Generates the traffic of number_of_users users as generate_synthethic_users_and_traffic does, without writing
+    any request: the traffic of every chunk of users is added to the load histogram, then dropped. The memory of the
+    workers thus depends on the chunk size and the number of bins, not on the number of users, the main process only
+    holds the class of every user, drawn once and sliced for each chunk. With the same options, the
+    histogram is the one of the traffic written by generate_synthethic_users_and_traffic, whatever users_per_chunk,
+    up to the rounding of the sums of volumes."""
+    options = {
+        "bin_seconds": bin_seconds,
+        "random_seed": random_seed,
+        "iat_sampling_method": iat_sampling_method,
+        "sampling_backend": sampling_backend,
+    }
+    # The classes are drawn once, as in generate_synthethic_users_and_traffic, the exact proportions rank the whole
+    # population
+    uids, klasses = generator.UserDistribution(number_of_users, random_seed, exact_class_proportions).class_codes()
+    histogram = LoadHistogram(bin_seconds)
+    iat_sampling_counters = dict((counter, 0) for counter in IATSampler().counters())
+    with Pool(number_of_workers or cpu_count(), worker_logging, (start_logging(),)) as pool:
+        # In chunk order, thus the volumes are always summed in the same order
+        for chunk_histogram, chunk_counters in pool.imap(
+            _aggregate_chunk, _chunks(uids, klasses, users_per_chunk, options)
+        ):
+            histogram.merge(chunk_histogram)
+            for counter, value in chunk_counters.items():
+                iat_sampling_counters[counter] += value
+    debug("IAT sampling (%s): %s" % (iat_sampling_method, iat_sampling_counters))
+    return histogram
+
+
+if __name__ == "__main__":
+    # python aggregate.py <number of synthetic users> [bin seconds] [output file] [number of workers]
+    number_of_synthetic_users = int(sys.argv[1]) if len(sys.argv) > 1 else generator.NUMBER_OF_SYNTHETIC_USERS
+    bin_seconds = int(sys.argv[2]) if len(sys.argv) > 2 else BIN_SECONDS
+    load_file = sys.argv[3] if len(sys.argv) > 3 else path.join(generator.USERS_DIRECTORY, LOAD_FILE)
+    number_of_workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    print(
+        "[+] Aggregating the load of %d synthetic users in %d seconds bins" % (number_of_synthetic_users, bin_seconds)
+    )
+    load = aggregate_load(number_of_synthetic_users, bin_seconds, number_of_workers)
+    if path.dirname(load_file):
+        makedirs(path.dirname(load_file), exist_ok=True)
+    load.save(load_file)
+    print("[+] %d requests, %.0f KB, stored in '%s'" % (load.requests.sum(), load.volume.sum(), load_file))
@@ -0,0 +1,212 @@
+# Synthetic Traffic Generator, Version 0.1
+# (c) 2015-2015, Inria, Palaiseau, France
+# Licensed under the GNU GPL, Version 3. For more details see LICENSE
+# Author: Eduardo Mucelli Rezende Oliveira (edumucelli@gmail.com)
+
+import json
+import platform
+import resource
+import sys
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from os import chdir, getcwd
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Dict
+
+import numpy as np
+
+import generator
+from log import stop_logging
+from output import ColumnarWriter
+
+# Populations benchmarked by default, and the file the results are written to
+BENCHMARK_SCALES = (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6)
+BENCHMARK_FILE = "benchmark.json"
+# Fixed day, so the timestamp stage always converts the same values
+BENCHMARK_DATE = datetime(2013, 8, 25)
+# The engine alone, then the per-user pipeline of run.py with each of these writers, up to PIPELINE_MAX_USERS users
+# by default: it generates the users one by one, and the text writer writes one file per user
+PIPELINE_FORMATS = ("text", "npy")
+PIPELINE_MAX_USERS = 10 ** 4
+# Bounded, see generator.ENGINE_IAT_SAMPLING_METHOD, the 'rejection' method takes minutes from 10^3 users on
+BENCHMARK_IAT_SAMPLING_METHOD = generator.ENGINE_IAT_SAMPLING_METHOD
+
+STAGES = (
+    "class_assignment",
+    "model_construction",
+    "number_of_requests",
+    "inter_arrival_times",
+    "volumes",
+    "ordering",
+    "timestamp_building",
+    "file_writing",
+)
+
+
+def benchmark(
+    number_of_users,
+    iat_sampling_method=BENCHMARK_IAT_SAMPLING_METHOD,
+    sampling_backend=generator.SAMPLING_BACKEND,
+    random_seed=generator.RANDOM_SEED,
+) -> Dict:
+    """Runs the whole batch pipeline for number_of_users users, and measures the wall time of each of its stages."""
+    stage_seconds = {}
+    started = perf_counter()
+
+    stage_started = perf_counter()
+    uids, klasses = generator.UserDistribution(number_of_users, random_seed).class_codes()
+    stage_seconds["class_assignment"] = perf_counter() - stage_started
+
+    stage_started = perf_counter()
+    generator.load_traffic_model_parameters(generator.TRAFFIC_MODEL_PARAMETERS_FILE)
+    for klass in generator.USER_CLASSES:
+        for hour in range(1, 24):
+            generator.shared_traffic_model(klass, hour, sampling_backend)
+    stage_seconds["model_construction"] = perf_counter() - stage_started
+
+    iat_sampler = generator.IATSampler(iat_sampling_method)
+    engine = generator.PopulationEngine(uids, klasses, BENCHMARK_DATE, random_seed, iat_sampler, sampling_backend)
+    traffic = engine.generate()
+    stage_seconds.update(engine.stage_seconds)
+
+    stage_started = perf_counter()
+    timestamps = traffic.datetimes(BENCHMARK_DATE)
+    stage_seconds["timestamp_building"] = perf_counter() - stage_started
+
+    stage_started = perf_counter()
+    with TemporaryDirectory() as directory:
+        ColumnarWriter(directory, "npy", generator.USER_CLASSES).write(
+            0, traffic.uid, timestamps, traffic.volume, traffic.klass
+        )
+    stage_seconds["file_writing"] = perf_counter() - stage_started
+
+    wall_seconds = perf_counter() - started
+    return {
+        "mode": "engine",
+        "users": number_of_users,
+        "requests": int(traffic.uid.size),
+        "wall_seconds": wall_seconds,
+        "users_per_second": number_of_users / wall_seconds,
+        "requests_per_second": traffic.uid.size / wall_seconds,
+        # ru_maxrss is in KiloBytes on Linux
+        "peak_rss_kilobytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "stage_seconds": dict((stage, stage_seconds[stage]) for stage in STAGES),
+        "iat_sampling": iat_sampler.counters(),
+    }
+
+
+def pipeline_benchmark(
+    number_of_users,
+    output_format="text",
+    iat_sampling_method=BENCHMARK_IAT_SAMPLING_METHOD,
+    sampling_backend=generator.SAMPLING_BACKEND,
+    random_seed=generator.RANDOM_SEED,
+    number_of_workers=None,
+) -> Dict:
+    """Runs generate_synthethic_users_and_traffic, as run.py does, for number_of_users users in a temporary directory,
+    and measures its wall time and the time its workers spent in each of generator.PIPELINE_STAGES."""
+    working_directory = getcwd()
+    with TemporaryDirectory() as directory:
+        chdir(directory)
+        try:
+            started = perf_counter()
+            summary = generator.generate_synthethic_users_and_traffic(
+                number_of_users,
+                number_of_workers,
+                generator.USERS_PER_CHUNK,
+                random_seed,
+                iat_sampling_method,
+                output_format,
+                sampling_backend,
+                initial_timestamp_date=BENCHMARK_DATE,
+            )
+            wall_seconds = perf_counter() - started
+        finally:
+            chdir(working_directory)
+            # The process is a worker of run_benchmarks, whose exit does not run the atexit handlers
+            stop_logging()
+    return {
+        "mode": "pipeline-%s" % output_format,
+        "users": number_of_users,
+        "requests": summary["requests"],
+        "wall_seconds": wall_seconds,
+        "users_per_second": number_of_users / wall_seconds,
+        "requests_per_second": summary["requests"] / wall_seconds,
+        # The users are generated by the worker processes, their peak RSS is the one of the largest of them
+        "peak_rss_kilobytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "peak_worker_rss_kilobytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        # Summed over the workers, thus larger than the wall time with more than one worker
+        "stage_seconds": summary["stage_seconds"],
+        "iat_sampling": summary["iat_sampling"],
+    }
+
+
+def run_benchmarks(
+    scales=BENCHMARK_SCALES,
+    iat_sampling_method=BENCHMARK_IAT_SAMPLING_METHOD,
+    sampling_backend=generator.SAMPLING_BACKEND,
+    random_seed=generator.RANDOM_SEED,
+    number_of_workers=None,
+    pipeline_max_users=PIPELINE_MAX_USERS,
+) -> Dict:
+    results = []
+    for number_of_users in scales:
+        runs = [(benchmark, (number_of_users, iat_sampling_method, sampling_backend, random_seed))]
+        for output_format in PIPELINE_FORMATS if number_of_users <= pipeline_max_users else ():
+            runs.append(
+                (
+                    pipeline_benchmark,
+                    (
+                        number_of_users,
+                        output_format,
+                        iat_sampling_method,
+                        sampling_backend,
+                        random_seed,
+                        number_of_workers,
+                    ),
+                )
+            )
+        for function, arguments in runs:
+            # Every run is in a fresh process, thus its peak RSS is not the one of the previous runs. Unlike the
+            # daemonic workers of a Pool, it can start the worker pool of the pipeline
+            with ProcessPoolExecutor(1) as executor:
+                results.append(executor.submit(function, *arguments).result())
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "random_seed": random_seed,
+        "iat_sampling_method": iat_sampling_method,
+        "sampling_backend": sampling_backend,
+        "number_of_workers": number_of_workers,
+        "pipeline_max_users": pipeline_max_users,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    # python benchmark.py [output file] [IAT sampling method] [sampling backend] [pipeline max users]
+    #                     [number of users ...]
+    # The number of workers of the pipeline runs is the number of CPUs
+    benchmark_file = sys.argv[1] if len(sys.argv) > 1 else BENCHMARK_FILE
+    iat_sampling_method = sys.argv[2] if len(sys.argv) > 2 else BENCHMARK_IAT_SAMPLING_METHOD
+    sampling_backend = sys.argv[3] if len(sys.argv) > 3 else generator.SAMPLING_BACKEND
+    pipeline_max_users = int(sys.argv[4]) if len(sys.argv) > 4 else PIPELINE_MAX_USERS
+    scales = [int(number_of_users) for number_of_users in sys.argv[5:]] or BENCHMARK_SCALES
+
+    report = run_benchmarks(scales, iat_sampling_method, sampling_backend, pipeline_max_users=pipeline_max_users)
+    for result in report["results"]:
+        print(
+            "[+] %s, %d users: %.1f s, %.0f users/s, %.0f requests/s, peak RSS %d KB"
+            % (
+                result["mode"],
+                result["users"],
+                result["wall_seconds"],
+                result["users_per_second"],
+                result["requests_per_second"],
+                result["peak_rss_kilobytes"],
+            )
+        )
+    with open(benchmark_file, "w") as results_file:
+        json.dump(report, results_file, indent=2)
+    print("[+] Results written to '%s'" % benchmark_file)
@@ -3,21 +3,40 @@
 # Licensed under the GNU GPL, Version 3. For more details see LICENSE
 # Author: Eduardo Mucelli Rezende Oliveira (edumucelli@gmail.com)
 
-from datetime import datetime, date, timedelta
-from multiprocessing import Process
+import json
+from datetime import datetime, date
+from multiprocessing import Pool, cpu_count
 from os import path, makedirs
-from typing import Dict, Union, Tuple, Iterator
+from time import perf_counter
+from typing import Dict, Tuple, Iterator, NamedTuple, List, Optional
 
+import numpy as np
 from numpy.random import seed, uniform
-from scipy.stats import gamma, weibull_min, lognorm, nbinom
 
-from log import debug
+from log import debug, start_logging, worker_logging
+from output import (
+    OUTPUT_FORMATS,
+    VOLUME_PRECISION,
+    ColumnarWriter,
+    file_sha256,
+    remove_manifests,
+    write_manifest,
+    write_text_traffic,
+)
+from samplers import frozen_distribution
 
 # Directory that will contain the resulting synthetic traffic.
 # Automatically created if does not exist.
 USERS_DIRECTORY = "users"
 # Directory that contains the synthetic request files, one per synthetic user
 SYNTHETIC_DIRECTORY = "synthetic"
+# Directory that contains the columnar shards of synthetic requests, one per USERS_PER_SHARD users
+COLUMNAR_DIRECTORY = "columnar"
+# Directory, within USERS_DIRECTORY, of the trace indexed by time, see trace_index
+TRACE_DIRECTORY = "trace"
+
+# Data file with the fitted parameters of the distributions of every user class
+TRAFFIC_MODEL_PARAMETERS_FILE = path.join(path.dirname(path.abspath(__file__)), "traffic_models.json")
 
 ONE_HOUR = 3600
 ONE_DAY = ONE_HOUR * 24
@@ -25,211 +44,222 @@ ONE_DAY = ONE_HOUR * 24
 # The number of resulting synthetic users
 NUMBER_OF_SYNTHETIC_USERS = 10
 
+# Number of users handed at once to a worker process
+USERS_PER_CHUNK = 100
+# Number of users of every shard of the columnar formats, each one generated by a single worker process
+USERS_PER_SHARD = 10000
+
+# Maximum number of requests in every batch of UserDistribution.chronological_traffic
+CHRONOLOGICAL_BATCH_SIZE = 65536
+
+# Root seed from which every random stream of a run is derived, to make the experiment reproducible
+RANDOM_SEED = 1234
+
+# Backend sampling the distributions, 'numpy' or the original 'scipy', see samplers.SAMPLING_BACKENDS
+SAMPLING_BACKEND = "numpy"
+
+# Last attempt at resampling the inter arrival times of one hour to fit in ONE_HOUR, attempts are counted from 0 as
+# in the original loop, thus they are resampled at most MAX_IAT_RESAMPLING_ATTEMPTS + 1 times
+MAX_IAT_RESAMPLING_ATTEMPTS = 100000
+
+# Candidate IAT vectors drawn at once per user, and the last attempt, for the 'batched' IATSampler, i.e., at most 256
+# candidates per user
+BATCHED_IAT_CANDIDATES = 64
+MAX_BATCHED_IAT_ATTEMPTS = 255
+
+# Stages of PopulationEngine whose duration is measured, see PopulationEngine.stage_seconds
+ENGINE_STAGES = ("number_of_requests", "inter_arrival_times", "volumes", "ordering")
+# IATSampler method of PopulationEngine when none is given. With 'rejection', a (class, hour) group is resampled,
+# one Python iteration per attempt, as long as a single one of its users does not fit in the hour, up to
+# MAX_IAT_RESAMPLING_ATTEMPTS + 1 times: the inter_arrival_times stage then dominates, at a few users per second. With
+# 'batched', at most MAX_BATCHED_IAT_ATTEMPTS + 1 candidates are drawn per user, in a few iterations per group, thus
+# the engine scales with the number of requests, at the cost of truncating the hours of the heavy users that do not
+# fit after them, see IATSampler.truncated_hours
+ENGINE_IAT_SAMPLING_METHOD = "batched"
+# Stages of the workers of generate_synthethic_users_and_traffic whose duration is measured
+PIPELINE_STAGES = ("user_generation", "ordering", "timestamp_building", "file_writing")
+
+# User classes, their position in this tuple is the compact code used by the batch engine
+USER_CLASSES = ("HF", "HO", "MF", "MO", "LF", "LO")
+USER_CLASS_CODES = dict((klass, code) for code, klass in enumerate(USER_CLASSES))
+
+
+class TrafficModelParameters(object):
+    """Registry of the fitted distributions, read from a data file such as TRAFFIC_MODEL_PARAMETERS_FILE.
+
+    For every kind of distribution ('volume', 'iat' and 'number_of_requests') and every user class, the file holds
+    the peak hours, the parameters used during them and the ones used during the off-peak hours.
+    """
+
+    def __init__(self, parameters):
+        self.parameters = parameters
+
+    @classmethod
+    def load(cls, file_path=None):
+        with open(file_path if file_path else TRAFFIC_MODEL_PARAMETERS_FILE) as parameters_file:
+            return cls(json.load(parameters_file))
+
+    def find(self, kind, user_class, hour) -> dict:
+        if user_class not in self.parameters[kind]:
+            raise Exception("The user class %s does not exist" % user_class)
+        parameters_per_class = self.parameters[kind][user_class]
+        if hour in parameters_per_class["peak_hours"]:
+            return parameters_per_class["peak"]
+        return parameters_per_class["off_peak"]
+
+
+# Process-wide registry and TrafficModel cache, shared by all users, see shared_traffic_model()
+_traffic_model_parameters = None
+_traffic_models = {}  # type: Dict[Tuple[str, int, str], TrafficModel]
+
+
+def traffic_model_parameters() -> TrafficModelParameters:
+    global _traffic_model_parameters
+    if _traffic_model_parameters is None:
+        _traffic_model_parameters = TrafficModelParameters.load()
+    return _traffic_model_parameters
+
+
+def load_traffic_model_parameters(file_path) -> None:
+    # Replaces the registry, e.g., with refitted parameters or new classes, and drops the models built from the old one
+    global _traffic_model_parameters
+    _traffic_model_parameters = TrafficModelParameters.load(file_path)
+    _traffic_models.clear()
+
 
 class Distribution(object):
+    # Kind of the distribution in the TrafficModelParameters registry
+    kind = None
+
+    __slots__ = ("user_class", "hour", "name")
+
     def __init__(self, user_class, hour):
         self.user_class = user_class
         self.hour = hour
         self.name = None
 
+    # Frozen distribution with an rvs(size, random_state) method, built by the 'numpy' or 'scipy' backend
+    def choose(self, backend=SAMPLING_BACKEND):
+        parameters = traffic_model_parameters().find(self.kind, self.user_class, self.hour)
+        self.name = parameters["distribution"]
+        return frozen_distribution(self.name, parameters, backend)
+
 
 class VolumeDistribution(Distribution):
-    def __init__(self, user_class, hour):
-        Distribution.__init__(self, user_class, hour)
-
-    def choose(self) -> weibull_min:
-        self.name = "Weibull"
-        if self.user_class == "HF":
-            peak_hours_for_volume_hf = [10, 11, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23]
-            if self.hour in peak_hours_for_volume_hf:
-                weibull_c_shape, weibull_scale, weibull_location = 0.819409132355671, 774639.610211396, 40
-                return weibull_min(weibull_c_shape, loc=weibull_location, scale=weibull_scale)
-            else:
-                weibull_c_shape, weibull_scale, weibull_location = 0.634477150024807, 384935.669023795, 40
-                return weibull_min(weibull_c_shape, loc=weibull_location, scale=weibull_scale)
-        elif self.user_class == "HO":
-            peak_hours_for_volume_ho = [1, 2, 6, 7, 8, 9, 10, 14, 15, 16, 17, 18, 19, 21]
-            if self.hour in peak_hours_for_volume_ho:
-                weibull_c_shape, weibull_scale, weibull_location = 0.498273622342091, 476551.703412746, 30
-            else:
-                weibull_c_shape, weibull_scale, weibull_location = 0.507073160695169, 452332.836400453, 30
-            return weibull_min(weibull_c_shape, loc=weibull_location, scale=weibull_scale)
-        elif self.user_class == "MF":
-            peak_hours_for_volume_mf = [10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22]
-            if self.hour in peak_hours_for_volume_mf:
-                weibull_c_shape, weibull_scale, weibull_location = 0.801202265360056, 13959.452422549, 37
-                return weibull_min(weibull_c_shape, loc=weibull_location, scale=weibull_scale)
-            else:
-                weibull_c_shape, weibull_scale, weibull_location = 0.797283673532605, 10657.9935943482, 33
-                return weibull_min(weibull_c_shape, loc=weibull_location, scale=weibull_scale)
-        elif self.user_class == "MO":
-            peak_hours_for_volume_mo = [1, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23]
-            if self.hour in peak_hours_for_volume_mo:
-                weibull_c_shape, weibull_scale, weibull_location = 0.596142171663733, 31936.8353050143, 29
-            else:
-                weibull_c_shape, weibull_scale, weibull_location = 0.588535361156048, 26617.7612810844, 30
-            return weibull_min(weibull_c_shape, loc=weibull_location, scale=weibull_scale)
-        elif self.user_class == "LF":
-            peak_hours_for_volume_lf = [8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22]
-            if self.hour in peak_hours_for_volume_lf:
-                weibull_c_shape, weibull_scale, weibull_location = 0.926450022452343, 1181.70293939011, 33
-            else:
-                weibull_c_shape, weibull_scale, weibull_location = 1.03429757728009, 873.579218199549, 34
-            return weibull_min(weibull_c_shape, loc=weibull_location, scale=weibull_scale)
-        elif self.user_class == "LO":
-            peak_hours_for_volume_lo = [1, 3, 4, 19, 20, 21, 22, 23]
-            if self.hour in peak_hours_for_volume_lo:
-                weibull_c_shape, weibull_scale, weibull_location = 0.856409898006734, 3228.75558535546, 29
-            else:
-                weibull_c_shape, weibull_scale, weibull_location = 0.797856625454382, 2800.11615587819, 29
-            return weibull_min(weibull_c_shape, loc=weibull_location, scale=weibull_scale)
-        else:
-            raise Exception("The user class %s does not exist" % self.user_class)
+    kind = "volume"
+
+    __slots__ = ()
 
 
 class IATDistribution(Distribution):
-    def __init__(self, user_class, hour):
-        Distribution.__init__(self, user_class, hour)
-
-    def choose(self) -> Union[lognorm, gamma, weibull_min]:
-        if self.user_class == "HF":
-            self.name = "Log-norm"
-            peak_hours_for_iat_hf = [1, 2, 3, 4, 5, 6]
-            if self.hour in peak_hours_for_iat_hf:
-                lognorm_shape, lognorm_scale, lognorm_location = 4.09174469261446, 1.12850165892419, 4.6875
-            else:
-                lognorm_shape, lognorm_scale, lognorm_location = 3.93740014906562, 0.982210300411203, 3
-            return lognorm(lognorm_shape, loc=lognorm_location, scale=lognorm_scale)
-        elif self.user_class == "HO":
-            self.name = "Gamma"
-            peak_hours_for_iat_ho = [2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]
-            if self.hour in peak_hours_for_iat_ho:
-                gamma_shape, gamma_rate, gamma_location = 1.25170029089175, 0.00178381168026473, 0.5
-            else:
-                gamma_shape, gamma_rate, gamma_location = 1.20448161464647, 0.00177591076721503, 0.5
-            return gamma(gamma_shape, loc=gamma_location, scale=1.0 / gamma_rate)
-        elif self.user_class == "MF":
-            self.name = "Gamma"
-            peak_hours_for_iat_mf = [1, 2, 3, 4, 5, 6, 7, 22, 23]
-            if self.hour in peak_hours_for_iat_mf:
-                gamma_shape, gamma_rate, gamma_location = 2.20816848575484, 0.00343216949000565, 1
-            else:
-                gamma_shape, gamma_rate, gamma_location = 2.03011412986896, 0.00342699308280547, 1
-            return gamma(gamma_shape, loc=gamma_location, scale=1.0 / gamma_rate)
-        elif self.user_class == "MO":
-            self.name = "Gamma"
-            peak_hours_for_iat_mo = [1, 2, 3, 4, 5, 6]
-            if self.hour in peak_hours_for_iat_mo:
-                gamma_shape, gamma_rate, gamma_location = 1.29908195595742, 0.00163527376977441, 0.5
-            else:
-                gamma_shape, gamma_rate, gamma_location = 1.19210494792398, 0.00170354443324898, 0.5
-            return gamma(gamma_shape, loc=gamma_location, scale=1.0 / gamma_rate)
-        elif self.user_class == "LF":
-            peak_hours_for_iat_lf = [1, 2, 3, 4, 5, 6, 7]
-            if self.hour in peak_hours_for_iat_lf:
-                self.name = "Gamma"
-                gamma_shape, gamma_rate, gamma_location = 1.79297773527656, 0.00191590321039876, 2
-                return gamma(gamma_shape, loc=gamma_location, scale=1.0 / gamma_rate)
-            else:
-                self.name = "Weibull"
-                weibull_c_shape, weibull_scale, weibull_location = 1.1988117443903, 827.961760834184, 1
-                return weibull_min(weibull_c_shape, loc=weibull_location, scale=weibull_scale)
-        elif self.user_class == "LO":
-            peak_hours_for_iat_lo = [2, 3, 4, 10, 11, 12, 13, 14, 15, 17, 18, 19, 20]
-            if self.hour in peak_hours_for_iat_lo:
-                self.name = "Weibull"
-                weibull_c_shape, weibull_scale, weibull_location = 0.850890858519732, 548.241539446292, 1
-                return weibull_min(weibull_c_shape, loc=weibull_location, scale=weibull_scale)
-            else:
-                self.name = "Gamma"
-                gamma_shape, gamma_rate, gamma_location = 0.707816241615835, 0.00135537879658998, 1
-                return gamma(gamma_shape, loc=gamma_location, scale=1.0 / gamma_rate)
-        else:
-            raise Exception("The user class %s does not exist" % self.user_class)
+    kind = "iat"
+
+    __slots__ = ()
 
 
 class NumberOfRequestsDistribution(Distribution):
-    def __init__(self, user_class, hour):
-        Distribution.__init__(self, user_class, hour)
-
-    def choose(self) -> nbinom:
-        self.name = "Neg-binomial"
-        if self.user_class == "HF":
-            peak_hours_for_number_of_requests_hf = [10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23]
-            if self.hour in peak_hours_for_number_of_requests_hf:
-                nbinom_n_size, nbinom_mu_mean = 0.470368548315641, 34.7861725808564
-            else:
-                nbinom_n_size, nbinom_mu_mean = 0.143761308534382, 14.158264589062
-        elif self.user_class == "HO":
-            peak_hours_for_number_of_requests_ho = [10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23]
-            if self.hour in peak_hours_for_number_of_requests_ho:
-                nbinom_n_size, nbinom_mu_mean = 0.113993444740046, 1.04026982546095
-            else:
-                nbinom_n_size, nbinom_mu_mean = 0.0448640346452827, 0.366034837767499
-        elif self.user_class == "MF":
-            peak_hours_for_number_of_requests_mf = [8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20]
-            if self.hour in peak_hours_for_number_of_requests_mf:
-                nbinom_n_size, nbinom_mu_mean = 0.758889839349924, 4.83390315655562
-            else:
-                nbinom_n_size, nbinom_mu_mean = 0.314653746175354, 3.22861572712093
-        elif self.user_class == "MO":
-            peak_hours_for_number_of_requests_mo = [8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22]
-            if self.hour in peak_hours_for_number_of_requests_mo:
-                nbinom_n_size, nbinom_mu_mean = 0.177211316065872, 0.406726610288464
-            else:
-                nbinom_n_size, nbinom_mu_mean = 0.0536955764781434, 0.124289074773539
-        elif self.user_class == "LF":
-            peak_hours_for_number_of_requests_lf = [8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21]
-            if self.hour in peak_hours_for_number_of_requests_lf:
-                nbinom_n_size, nbinom_mu_mean = 0.480203280455517, 0.978733578849008
-            else:
-                nbinom_n_size, nbinom_mu_mean = 0.240591506072217, 0.487956906502501
-        elif self.user_class == "LO":
-            peak_hours_for_number_of_requests_lo = [8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22]
-            if self.hour in peak_hours_for_number_of_requests_lo:
-                nbinom_n_size, nbinom_mu_mean = 0.188551092877969, 0.111187768162793
-            else:
-                nbinom_n_size, nbinom_mu_mean = 0.0810585648991726, 0.0405013083716073
-        else:
-            raise Exception("The user class %s does not exist" % self.user_class)
-        # From R's documentation: An alternative parametrization (often used in ecology) is by the
-        #  _mean_ 'mu', and 'size', the _dispersion parameter_, where 'prob' = 'size/(size+mu)'
-        nbinom_prob = nbinom_n_size / (nbinom_n_size + nbinom_mu_mean)
-        return nbinom(nbinom_n_size, nbinom_prob)
+    kind = "number_of_requests"
+
+    __slots__ = ()
 
 
 class TrafficModel(object):
-    def __init__(self, user_class="HF", hour=1):
+    __slots__ = ("volume_distribution", "iat_distribution", "number_of_requests_distribution")
+
+    def __init__(self, user_class="HF", hour=1, backend=SAMPLING_BACKEND):
         # Gamma or Weibull distributed in KiloBytes
-        self.volume_distribution = VolumeDistribution(user_class, hour).choose()
+        self.volume_distribution = VolumeDistribution(user_class, hour).choose(backend)
         # Gamma or Log-normal distributed in seconds
-        self.iat_distribution = IATDistribution(user_class, hour).choose()
+        self.iat_distribution = IATDistribution(user_class, hour).choose(backend)
         # Negative binomial
-        self.number_of_requests_distribution = NumberOfRequestsDistribution(user_class, hour).choose()
+        self.number_of_requests_distribution = NumberOfRequestsDistribution(user_class, hour).choose(backend)
+
+
+def shared_traffic_model(user_class, hour, backend=None) -> TrafficModel:
+    # There is only one model per (class, hour, backend), built once and shared by every user of the process
+    key = (user_class, hour, backend if backend else SAMPLING_BACKEND)
+    if key not in _traffic_models:
+        _traffic_models[key] = TrafficModel(*key)
+    return _traffic_models[key]
+
+
+class SyntheticTraffic(NamedTuple):
+    """Struct-of-arrays holding the requests of many users, one position per request."""
+
+    # User ID of the request
+    uid: np.ndarray
+    # Arrival time of the request in seconds since the midnight of the generated day
+    timestamp: np.ndarray
+    # Volume of the request in KiloBytes
+    volume: np.ndarray
+    # Code of the user class, i.e., its position in USER_CLASSES
+    klass: np.ndarray
+
+    def datetimes(self, day) -> np.ndarray:
+        return to_datetime64(day, self.timestamp)
+
+
+def to_datetime64(day, seconds) -> np.ndarray:
+    # Datetimes 'seconds' after the midnight of 'day', rounded to microseconds as datetime + timedelta does
+    midnight = np.datetime64(date(day.year, day.month, day.day), "us")
+    return midnight + np.rint(np.asarray(seconds, dtype=float) * 1e6).astype(np.int64).astype("timedelta64[us]")
 
 
 class User(object):
-    def __init__(self, uid, klass, initial_timestamp_date=datetime.utcnow()):
+    __slots__ = (
+        "uid",
+        "klass",
+        "iat_sampler",
+        "sampling_backend",
+        "initial_timestamp_date",
+        "hours",
+        "request_arrival_times",
+        "request_file_sizes",
+        "hour_offsets",
+    )
+
+    def __init__(self, uid, klass, initial_timestamp_date=None, iat_sampler=None, sampling_backend=None):
         self.uid = uid
         self.klass = klass
+        self.iat_sampler = iat_sampler if iat_sampler else IATSampler(ENGINE_IAT_SAMPLING_METHOD)
+        self.sampling_backend = sampling_backend
 
-        self.initial_timestamp_date = initial_timestamp_date
+        self.initial_timestamp_date = initial_timestamp_date if initial_timestamp_date else datetime.utcnow()
         # Remember, hours from 1 to 23, 0 was removed because it is behaving awkwardly
         self.hours = range(1, 24)
 
-        # {1: TrafficModel, 2: TrafficModel, ...}
-        self.traffic_model_per_hour = self.find_traffic_model_per_hour()
+        # Arrival times in seconds since the beginning of their hour, and volumes, of all the requests in one array
+        # each, hour after hour. The requests of self.hours[i] are the ones from hour_offsets[i] to
+        # hour_offsets[i + 1]. The datetimes are only built on demand, see arrival_timestamps and requests.
+        self.request_arrival_times = np.empty(0)
+        self.request_file_sizes = np.empty(0)
+        self.hour_offsets = np.zeros(len(self.hours) + 1, dtype=np.int64)
+
+    # {1: TrafficModel, 2: TrafficModel, ...}, the models are shared by all users, see shared_traffic_model
+    @property
+    def traffic_model_per_hour(self) -> Dict[int, TrafficModel]:
+        return self.find_traffic_model_per_hour()
 
-        self.request_arrival_times_per_hour = dict((hour, []) for hour in self.hours)
-        self.request_arrival_datetimes_per_hour = dict((hour, []) for hour in self.hours)
-        self.request_file_sizes_per_hour = dict((hour, []) for hour in self.hours)
+    # {1: arrival times, 2: ...}, views of request_arrival_times
+    @property
+    def request_arrival_times_per_hour(self) -> Dict[int, np.ndarray]:
+        return dict((hour, self.request_arrival_times[self.hour_slice(hour)]) for hour in self.hours)
+
+    # {1: volumes, 2: ...}, views of request_file_sizes
+    @property
+    def request_file_sizes_per_hour(self) -> Dict[int, np.ndarray]:
+        return dict((hour, self.request_file_sizes[self.hour_slice(hour)]) for hour in self.hours)
+
+    def hour_slice(self, hour) -> slice:
+        position = self.hours.index(hour)
+        return slice(self.hour_offsets[position], self.hour_offsets[position + 1])
 
     # Set the traffic model that corresponds to the user class, e.g,
     # 'HF' + peak hour => Volume {Weibull or Gamma}, Number of requests {Neg-Binomial}, ...
     def find_traffic_model_per_hour(self) -> Dict[int, TrafficModel]:
         traffic_model_per_hour = {}
         for hour in self.hours:
-            traffic_model_per_hour[hour] = TrafficModel(self.klass, hour)
+            traffic_model_per_hour[hour] = shared_traffic_model(self.klass, hour, self.sampling_backend)
         return traffic_model_per_hour
 
     #  def generate_synthetic_traffic(self):
@@ -261,111 +291,353 @@ class User(object):
     #      for session_volume, session_arrival_datetime in zip(self.session_volumes_per_hour[hour], self.session_arrival_datetimes_per_hour[hour]):
     #        yield [session_volume, session_arrival_datetime]
 
-    def generate_synthetic_traffic(self) -> None:
-        for hour, traffic_model in self.traffic_model_per_hour.items():
-            number_of_requests = traffic_model.number_of_requests_distribution.rvs()
+    # 'random_state' is a numpy.random.Generator, if None the global numpy random state is used
+    def generate_synthetic_traffic(self, random_state=None) -> None:
+        arrival_times_per_hour, file_sizes_per_hour = [], []
+        for position, hour in enumerate(self.hours):
+            traffic_model = shared_traffic_model(self.klass, hour, self.sampling_backend)
+            number_of_requests = traffic_model.number_of_requests_distribution.rvs(random_state=random_state)
 
             if number_of_requests > 0:
-                mean_inter_arrival_times = []
-                if number_of_requests == 1:
-                    mean_inter_arrival_times.append(traffic_model.iat_distribution.rvs())
-                else:
-                    # The number of requests and inter arrival times are generated by two different distributions and
-                    # here is the drawback: If the number of requests is big, the IAT should be distributed in small
-                    # values in order to not surpass one hour, But the IATDistribution is not aware about how many
-                    # requests were generated, they are two independent variables. Therefore, we have to resample the
-                    # mean IATs, that summed up, would not go beyond one hour.
-                    mean_inter_arrival_times_attempt = traffic_model.iat_distribution.rvs(size=number_of_requests)
-                    attempt = 0
-                    while sum(mean_inter_arrival_times_attempt) > ONE_HOUR and attempt <= 100000:
-                        mean_inter_arrival_times_attempt = traffic_model.iat_distribution.rvs(size=number_of_requests)
-                        attempt += 1
-                    mean_inter_arrival_times.extend(mean_inter_arrival_times_attempt)
-
-                # The number of requests and inter arrival times are generated by two different distributions and
-                # here is the drawback: If the number of requests is big, the IAT should be distributed in small
-                # values in order to not surpass one hour, But the IATDistribution is not aware about how many
-                # requests were generated, they are two independent variables. Therefore, we have to remove requests,
-                # mean IAT and arrival times, that summed up, would go beyond one hour.
-                while sum(mean_inter_arrival_times) > ONE_HOUR:
-                    number_of_requests -= 1
-                    mean_inter_arrival_times.pop()
-
-                arrival_times = []
-                arrival_datetimes = []
-                for index, time in enumerate(mean_inter_arrival_times):
-                    if index == 0:
-                        arrival_times.append(time)
-                        arrival_datetimes.append(
-                            datetime(
-                                self.initial_timestamp_date.year,
-                                self.initial_timestamp_date.month,
-                                self.initial_timestamp_date.day,
-                                hour,
-                            )
-                            + timedelta(seconds=time)
-                        )
-                    else:
-                        arrival_times.append(arrival_times[index - 1] + time)
-                        arrival_datetimes.append(
-                            datetime(
-                                self.initial_timestamp_date.year,
-                                self.initial_timestamp_date.month,
-                                self.initial_timestamp_date.day,
-                                hour,
-                            )
-                            + timedelta(seconds=arrival_times[index - 1] + time)
-                        )
-                self.request_arrival_times_per_hour[hour].extend(arrival_times)
-                self.request_arrival_datetimes_per_hour[hour].extend(arrival_datetimes)
-
-                volumes_of_traffic = []
+                # Arrival times within the hour, see IATSampler for how they are kept within ONE_HOUR, which may
+                # remove some of the requests
+                arrival_times, (number_of_requests,) = self.iat_sampler.sample(
+                    traffic_model.iat_distribution, [number_of_requests], random_state
+                )
+                arrival_times_per_hour.append(arrival_times)
+
                 # The distribution for the volume of traffic was measure for the *whole* hour. It means that each
                 # sampling from the volume_distribution returns the expected volume for the whole hour. We have then
                 # to divide this volume by the number of requests in that hour to have one volume per request.
                 # traffic_model.volume_distribution.rvs(size = number_of_requests) / number_of_requests - this snipt
                 # generates an array with one volume of traffic per request and divide *all at the same time* by the
                 # number of requests
-                volumes_of_traffic.extend(
-                    traffic_model.volume_distribution.rvs(size=number_of_requests) / number_of_requests
+                file_sizes_per_hour.append(
+                    traffic_model.volume_distribution.rvs(size=number_of_requests, random_state=random_state)
+                    / number_of_requests
                 )
-                self.request_file_sizes_per_hour[hour].extend(volumes_of_traffic)
+            else:
+                number_of_requests = 0
+            self.hour_offsets[position + 1] = self.hour_offsets[position] + number_of_requests
+        self.request_arrival_times = np.concatenate(arrival_times_per_hour) if arrival_times_per_hour else np.empty(0)
+        self.request_file_sizes = np.concatenate(file_sizes_per_hour) if file_sizes_per_hour else np.empty(0)
+
+    def arrival_times(self) -> np.ndarray:
+        # Arrival times of all the requests in seconds since midnight
+        hours = np.repeat(np.asarray(self.hours), np.diff(self.hour_offsets))
+        return hours * ONE_HOUR + self.request_arrival_times
+
+    def arrival_timestamps(self, hour=None) -> np.ndarray:
+        # Arrival datetimes of the requests of the hour, of all hours by default, as a numpy.datetime64 array
+        if hour is None:
+            return to_datetime64(self.initial_timestamp_date, self.arrival_times())
+        return to_datetime64(
+            self.initial_timestamp_date, hour * ONE_HOUR + self.request_arrival_times[self.hour_slice(hour)]
+        )
+
+    def traffic(self) -> SyntheticTraffic:
+        arrival_times = self.arrival_times()
+        return SyntheticTraffic(
+            np.full(arrival_times.size, self.uid, dtype=np.int64),
+            arrival_times,
+            self.request_file_sizes,
+            np.full(arrival_times.size, USER_CLASS_CODES[self.klass], dtype=np.int8),
+        )
 
     def requests(self) -> Iterator[Tuple[float, datetime]]:
-        for hour in range(1, 24):
-            for filesize, arrival_datetime in zip(
-                self.request_file_sizes_per_hour[hour], self.request_arrival_datetimes_per_hour[hour]
-            ):
-                yield [filesize, arrival_datetime]
+        # tolist() converts the datetime64 array into datetime objects, only for the callers asking for them
+        for filesize, arrival_datetime in zip(self.request_file_sizes.tolist(), self.arrival_timestamps().tolist()):
+            yield [filesize, arrival_datetime]
 
-    def write_traffic_to_file(self) -> None:
+    # volume_precision is the number of digits after the decimal point of the volumes, see output.text_lines
+    def write_traffic_to_file(self, volume_precision=VOLUME_PRECISION) -> None:
         user_syntethic_trace_path = path.join(USERS_DIRECTORY, SYNTHETIC_DIRECTORY)
-        if not path.exists(user_syntethic_trace_path):
-            makedirs(user_syntethic_trace_path)
+        makedirs(user_syntethic_trace_path, exist_ok=True)
         debug("Generating synthetic traffic for user %s" % self.uid)
         with open(path.join(user_syntethic_trace_path, "%s.dat" % self.uid), "w") as user_syntethic_trace_file:
-            for filesize, arrival_datetime in self.requests():
-                # Remove the microsecond part from the datetime
-                user_syntethic_trace_file.write(
-                    "%s %s %s %s\n" % (arrival_datetime.strftime("%Y-%m-%d %H:%M:%S"), self.uid, filesize, self.klass)
-                )  # 2013-08-25 00:10:58 13 30.7411159743, HF
-
-    def generate_and_write_synthetic_traffic(self) -> None:
+            # 2013-08-25 00:10:58 13 30.7411159743 HF
+            write_text_traffic(
+                user_syntethic_trace_file,
+                self.arrival_timestamps(),
+                self.uid,
+                self.request_file_sizes,
+                self.klass,
+                volume_precision,
+            )
+
+    def generate_and_write_synthetic_traffic(self, random_state=None, volume_precision=VOLUME_PRECISION) -> None:
         # Numpy has the same seed for each child process, thus users sharing
         # the same distributions get same values from rvs method
         # A way workaround this is to reseed for every process spawned by multiprocessing
         # http://stackoverflow.com/a/14505947/914874
         #    pid = current_process()._identity[0]
         #    seed(pid)
-        seed(self.uid)
-        self.generate_synthetic_traffic()
-        self.write_traffic_to_file()
+        # When an explicit numpy.random.Generator is given, it is used instead of the global random state
+        if random_state is None:
+            seed(self.uid)
+        self.generate_synthetic_traffic(random_state)
+        self.write_traffic_to_file(volume_precision)
+
+
+def _segment_sums(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # Sum of each consecutive segment of 'values', segment i has counts[i] elements (possibly none)
+    sums = np.zeros(len(counts))
+    non_empty = counts > 0
+    if non_empty.any():
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        sums[non_empty] = np.add.reduceat(values, starts[non_empty])
+    return sums
+
+
+def _segment_ranks(counts: np.ndarray) -> np.ndarray:
+    # Position of each element inside its segment, e.g., counts [2, 3] => [0, 1, 0, 1, 2]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    return np.arange(counts.sum()) - np.repeat(starts, counts)
+
+
+class IATSampler(object):
+    """Samples the arrival times of the requests of one hour, for one or many users at once.
+
+    The number of requests and inter arrival times are generated by two different distributions and here is the
+    drawback: If the number of requests is big, the IAT should be distributed in small values in order to not surpass
+    one hour, But the IATDistribution is not aware about how many requests were generated, they are two independent
+    variables. The method chooses how the IATs of users with more than one request are brought within ONE_HOUR:
+
+    - 'rejection': the IATs are resampled, up to max_attempts + 1 times, while their sum goes beyond ONE_HOUR. This
+      is the original behaviour, its cost is unbounded in practice for heavy users.
+    - 'batched': the same rejection, but batch_size candidate IAT vectors are drawn at once for every pending user
+      and the first one that fits is kept, with at most max_attempts + 1 candidates per user as well.
+    - 'scaled': the IATs are drawn once and, when their sum goes beyond ONE_HOUR, scaled down to fit in it.
+
+    Requests whose arrival time is still beyond ONE_HOUR afterwards are removed. The counters keep track of the work
+    done and of the requests removed, to compare the statistical fidelity and the speed of the methods.
+    """
+
+    METHODS = ("rejection", "batched", "scaled")
+
+    def __init__(self, method="rejection", max_attempts=None, batch_size=BATCHED_IAT_CANDIDATES):
+        if method not in self.METHODS:
+            raise Exception("The IAT sampling method %s does not exist" % method)
+        self.method = method
+        if max_attempts is None:
+            max_attempts = MAX_IAT_RESAMPLING_ATTEMPTS if method == "rejection" else MAX_BATCHED_IAT_ATTEMPTS
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.reset_counters()
+
+    def reset_counters(self) -> None:
+        # IAT vectors drawn, one per (user, hour) plus the resampled ones
+        self.attempts = 0
+        # (user, hour) whose first IAT vector did not fit in ONE_HOUR
+        self.rejected_hours = 0
+        # (user, hour) whose IATs were scaled down, only for the 'scaled' method
+        self.scaled_hours = 0
+        # (user, hour) that lost requests, and the number of requests lost
+        self.truncated_hours = 0
+        self.truncated_requests = 0
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "attempts": self.attempts,
+            "rejected_hours": self.rejected_hours,
+            "scaled_hours": self.scaled_hours,
+            "truncated_hours": self.truncated_hours,
+            "truncated_requests": self.truncated_requests,
+        }
+
+    def sample(self, iat_distribution, counts, random_state=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Samples counts[i] IATs for every user i, users with no request included.
+
+        Returns the arrival times within the hour of the remaining requests, user after user, and the number of
+        remaining requests of every user.
+        """
+        counts = np.asarray(counts, dtype=np.int64)
+        inter_arrival_times = np.asarray(iat_distribution.rvs(size=counts.sum(), random_state=random_state), float)
+        self.attempts += int(np.count_nonzero(counts))
+
+        rejected = (counts > 1) & (_segment_sums(inter_arrival_times, counts) > ONE_HOUR)
+        self.rejected_hours += int(np.count_nonzero(rejected))
+        if self.method == "rejection":
+            self._resample(iat_distribution, inter_arrival_times, counts, np.flatnonzero(rejected), random_state)
+        elif self.method == "batched":
+            self._resample_in_batches(
+                iat_distribution, inter_arrival_times, counts, np.flatnonzero(rejected), random_state
+            )
+        else:
+            inter_arrival_times = self._scale(inter_arrival_times, counts)
+
+        # Arrival times are the cumulative IATs restarted for every user, the ones beyond ONE_HOUR are removed
+        cumulative = np.cumsum(inter_arrival_times)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        arrival_times = cumulative - np.repeat(np.concatenate(([0.0], cumulative))[starts], counts)
+        if self.method == "scaled":
+            # Only rounding errors may go beyond ONE_HOUR after scaling
+            arrival_times = np.minimum(arrival_times, ONE_HOUR)
+        kept = arrival_times <= ONE_HOUR
+        kept_counts = _segment_sums(kept, counts).astype(np.int64)
+        self.truncated_hours += int(np.count_nonzero(kept_counts < counts))
+        self.truncated_requests += int(counts.sum() - kept_counts.sum())
+        return arrival_times[kept], kept_counts
+
+    def _resample(self, iat_distribution, inter_arrival_times, counts, pending, random_state) -> None:
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        attempt = 0
+        while pending.size > 0 and attempt <= self.max_attempts:
+            pending_counts = counts[pending]
+            resampled = np.asarray(iat_distribution.rvs(size=pending_counts.sum(), random_state=random_state), float)
+            inter_arrival_times[np.repeat(starts[pending], pending_counts) + _segment_ranks(pending_counts)] = resampled
+            self.attempts += pending.size
+            pending = pending[_segment_sums(resampled, pending_counts) > ONE_HOUR]
+            attempt += 1
+
+    def _resample_in_batches(self, iat_distribution, inter_arrival_times, counts, pending, random_state) -> None:
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        attempt = 0
+        while pending.size > 0 and attempt <= self.max_attempts:
+            batch_size = min(self.batch_size, self.max_attempts + 1 - attempt)
+            pending_counts = counts[pending]
+            # batch_size candidate vectors per pending user, laid out user after user
+            candidate_counts = np.repeat(pending_counts, batch_size)
+            candidates = np.asarray(iat_distribution.rvs(size=candidate_counts.sum(), random_state=random_state), float)
+            fits = (_segment_sums(candidates, candidate_counts) <= ONE_HOUR).reshape(pending.size, batch_size)
+            # The first candidate that fits, or the last one if none does, as the 'rejection' method keeps the last
+            chosen = np.where(fits.any(axis=1), fits.argmax(axis=1), batch_size - 1)
+            candidate_starts = np.concatenate(([0], np.cumsum(candidate_counts)[:-1]))
+            chosen_starts = candidate_starts[np.arange(pending.size) * batch_size + chosen]
+            ranks = _segment_ranks(pending_counts)
+            inter_arrival_times[np.repeat(starts[pending], pending_counts) + ranks] = candidates[
+                np.repeat(chosen_starts, pending_counts) + ranks
+            ]
+            self.attempts += pending.size * batch_size
+            pending = pending[~fits.any(axis=1)]
+            attempt += batch_size
+
+    def _scale(self, inter_arrival_times, counts) -> np.ndarray:
+        sums = _segment_sums(inter_arrival_times, counts)
+        overflowing = sums > ONE_HOUR
+        self.scaled_hours += int(np.count_nonzero(overflowing))
+        factors = np.where(overflowing, ONE_HOUR / np.where(sums > 0, sums, 1.0), 1.0)
+        return inter_arrival_times * np.repeat(factors, counts)
+
+
+class PopulationEngine(object):
+    """Batch counterpart of User, generates the traffic of a whole population with a few large array calls.
+
+    Users are grouped by (class, hour), and each group draws its number of requests, inter arrival times and volumes
+    at once, following the same per-hour model as User.generate_synthetic_traffic. Every group has its own random
+    generator derived from 'random_seed', an int or a sequence of ints as numpy.random.SeedSequence accepts, so the
+    result does not depend on the order the groups are generated. The IATs are sampled with iat_sampler, an
+    IATSampler of ENGINE_IAT_SAMPLING_METHOD by default.
+    """
+
+    def __init__(
+        self,
+        uids,
+        klasses,
+        initial_timestamp_date=None,
+        random_seed=RANDOM_SEED,
+        iat_sampler=None,
+        sampling_backend=None,
+        hours=None,
+    ):
+        # Compact population: one user ID and one class code per user
+        self.uids = np.asarray(uids, dtype=np.int64)
+        self.klasses = np.asarray(klasses, dtype=np.int8)
+        self.initial_timestamp_date = initial_timestamp_date if initial_timestamp_date else datetime.utcnow()
+        self.random_seed = random_seed
+        self.iat_sampler = iat_sampler if iat_sampler else IATSampler(ENGINE_IAT_SAMPLING_METHOD)
+        self.sampling_backend = sampling_backend
+        # Same hours as User by default, from 1 to 23
+        self.hours = hours if hours is not None else range(1, 24)
+        # Seconds spent in each stage of the generation, summed over all the generated hours
+        self.stage_seconds = dict((stage, 0.0) for stage in ENGINE_STAGES)
+
+    @classmethod
+    def from_user_distribution(
+        cls, user_distribution, initial_timestamp_date=None, random_seed=RANDOM_SEED, iat_sampler=None, **options
+    ):
+        uids, klasses = user_distribution.class_codes()
+        return cls(uids, klasses, initial_timestamp_date, random_seed, iat_sampler, **options)
+
+    def random_state(self, hour, klass) -> np.random.Generator:
+        seed_sequence = np.random.SeedSequence(self.random_seed, spawn_key=(hour, USER_CLASS_CODES[klass]))
+        return np.random.default_rng(seed_sequence)
+
+    def generate_hour(self, hour) -> SyntheticTraffic:
+        uids, timestamps, volumes, klasses = [], [], [], []
+        for code, klass in enumerate(USER_CLASSES):
+            group = self.uids[self.klasses == code]
+            if group.size == 0:
+                continue
+            random_state = self.random_state(hour, klass)
+            traffic_model = shared_traffic_model(klass, hour, self.sampling_backend)
+            started = perf_counter()
+            number_of_requests = traffic_model.number_of_requests_distribution.rvs(
+                size=group.size, random_state=random_state
+            )
+            self.stage_seconds["number_of_requests"] += perf_counter() - started
+            started = perf_counter()
+            arrival_times, number_of_requests = self.iat_sampler.sample(
+                traffic_model.iat_distribution, number_of_requests, random_state
+            )
+            self.stage_seconds["inter_arrival_times"] += perf_counter() - started
+            started = perf_counter()
+            # As in User, the volume of the whole hour is equally divided by the number of requests of the hour
+            per_request_counts = np.repeat(number_of_requests, number_of_requests)
+            volume = traffic_model.volume_distribution.rvs(size=per_request_counts.size, random_state=random_state)
+            self.stage_seconds["volumes"] += perf_counter() - started
+            uids.append(np.repeat(group, number_of_requests))
+            timestamps.append(hour * ONE_HOUR + arrival_times)
+            volumes.append(volume / per_request_counts)
+            klasses.append(np.full(per_request_counts.size, code, dtype=np.int8))
+        return SyntheticTraffic(
+            np.concatenate(uids) if uids else np.empty(0, dtype=np.int64),
+            np.concatenate(timestamps) if timestamps else np.empty(0),
+            np.concatenate(volumes) if volumes else np.empty(0),
+            np.concatenate(klasses) if klasses else np.empty(0, dtype=np.int8),
+        )
+
+    def generate(self) -> SyntheticTraffic:
+        hourly_traffic = [self.generate_hour(hour) for hour in self.hours]
+        started = perf_counter()
+        traffic = SyntheticTraffic(*(np.concatenate(column) for column in zip(*hourly_traffic)))
+        # Requests ordered user after user, and chronologically for each user, as in the per-user files
+        order = np.lexsort((traffic.timestamp, traffic.uid))
+        traffic = SyntheticTraffic(*(column[order] for column in traffic))
+        self.stage_seconds["ordering"] += perf_counter() - started
+        return traffic
+
+
+def _splitmix64(values: np.ndarray) -> np.ndarray:
+    # Finalizer of the splitmix64 generator, a bijection of uint64 that spreads every input bit over all output bits
+    with np.errstate(over="ignore"):
+        values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return values ^ (values >> np.uint64(31))
+
+
+def uid_uniforms(uids, random_seed) -> np.ndarray:
+    # Uniforms in [0, 1), one per uid, that only depend on the uid and random_seed. Unlike a sequential stream, the
+    # uniform of a user is the same whatever the range of users drawn, e.g., by one host out of many.
+    key = _splitmix64(np.array([random_seed], dtype=np.uint64))
+    with np.errstate(over="ignore"):
+        mixed = _splitmix64(np.asarray(uids, dtype=np.uint64) * np.uint64(0x9E3779B97F4A7C15) + key)
+    return (mixed >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
 
 
 class UserDistribution(object):
-    def __init__(self, number_of_users):
+    # Classes in the order of their cumulative probabilities, a uniform draw u gives the first class whose
+    # cumulative probability is at least u
+    CDF_CLASSES = ("MO", "LO", "HO", "LF", "MF", "HF")
+
+    def __init__(self, number_of_users, random_seed=None, exact_proportions=False):
         self.number_of_users = number_of_users
         self.total_number_of_users = number_of_users
+        # When given, the class of a user only depends on its uid and random_seed, see uid_uniforms. Otherwise,
+        # classes are drawn one user after the other from the global numpy random state.
+        self.random_seed = random_seed
+        # When True, the number of users of each class is the closest to the empirical proportions, see class_counts
+        self.exact_proportions = exact_proportions
 
         # Empirical probabilities from the original's dataset distribution given by
         # the number of users on a category divided by the total number of users
@@ -376,37 +648,274 @@ class UserDistribution(object):
         self.mf_probability = 0.008291246429397832  # 12577
         self.hf_probability = 0.0014384590688515599  # 2182
 
+        self.probabilities = np.array([getattr(self, "%s_probability" % klass.lower()) for klass in self.CDF_CLASSES])
+        self.cdf = np.cumsum(self.probabilities)
+        # Class code, see USER_CLASSES, of each position of the CDF
+        self.cdf_codes = np.array([USER_CLASS_CODES[klass] for klass in self.CDF_CLASSES], dtype=np.int8)
+
     def users(self) -> Iterator[User]:
-        for uid in range(self.number_of_users):
-            # uniformly randomly choose an user class based on their probabilities
-            probability = uniform()
-            if probability <= self.mo_probability:
-                klass = "MO"
-            elif probability <= self.mo_probability + self.lo_probability:
-                klass = "LO"
-            elif probability <= self.mo_probability + self.lo_probability + self.ho_probability:
-                klass = "HO"
-            elif probability <= self.mo_probability + self.lo_probability + self.ho_probability + self.lf_probability:
-                klass = "LF"
-            elif (
-                probability
-                <= self.mo_probability
-                + self.lo_probability
-                + self.ho_probability
-                + self.lf_probability
-                + self.mf_probability
-            ):
-                klass = "MF"
-            else:
-                klass = "HF"
+        for uid, klass in self.classes():
             yield User(uid, klass)
 
-
-def generate_synthethic_users_and_traffic(number_of_users=NUMBER_OF_SYNTHETIC_USERS) -> None:
-    # Makes the random numbers predictable, to make the experiment reproducible.
-    seed(1234)
-    user_generator = UserDistribution(number_of_users)
-    # generate_and_write_synthetic_traffic is a very light method, thus it
-    # is not necessary to create a pool of processes and join them later on
-    for user in user_generator.users():
-        Process(target=user.generate_and_write_synthetic_traffic).start()
+    # Users from first_uid to last_uid (excluded), all of them by default
+    def classes(self, first_uid=0, last_uid=None) -> Iterator[Tuple[int, str]]:
+        uids, codes = self.class_codes(first_uid, last_uid)
+        for uid, code in zip(uids.tolist(), codes.tolist()):
+            yield uid, USER_CLASSES[code]
+
+    def class_codes(self, first_uid=0, last_uid=None) -> Tuple[np.ndarray, np.ndarray]:
+        """Compact form of classes(): the uids from first_uid to last_uid (excluded) and their class codes, see
+        USER_CLASSES, as int64 and int8 arrays."""
+        last_uid = self.number_of_users if last_uid is None else last_uid
+        if self.exact_proportions:
+            # The users are ranked by their uniform, and the ranks split in consecutive ranges of class_counts users
+            uniforms = self.uniforms(0, self.number_of_users)
+            ranks = np.empty(self.number_of_users, dtype=np.int64)
+            ranks[np.argsort(uniforms, kind="stable")] = np.arange(self.number_of_users)
+            positions = np.searchsorted(np.cumsum(self.class_counts()), ranks[first_uid:last_uid], side="right")
+        else:
+            positions = np.searchsorted(self.cdf, self.uniforms(first_uid, last_uid), side="left")
+        # Rounding may leave the CDF slightly below 1, the last class takes the rest
+        positions = np.minimum(positions, len(self.cdf_codes) - 1)
+        return np.arange(first_uid, last_uid, dtype=np.int64), self.cdf_codes[positions]
+
+    def uniforms(self, first_uid, last_uid) -> np.ndarray:
+        if self.random_seed is None:
+            # uniformly randomly choose an user class based on their probabilities, the draws of the users before
+            # first_uid are skipped to keep the stream of the global random state
+            return uniform(size=last_uid)[first_uid:]
+        return uid_uniforms(np.arange(first_uid, last_uid), self.random_seed)
+
+    def class_counts(self) -> np.ndarray:
+        # Number of users of each class of CDF_CLASSES, closest to the empirical proportions and summing to the
+        # number of users, by the largest remainder method
+        expected = self.probabilities / self.probabilities.sum() * self.number_of_users
+        counts = np.floor(expected).astype(np.int64)
+        remainders = np.argsort(counts - expected, kind="stable")
+        counts[remainders[: self.number_of_users - counts.sum()]] += 1
+        return counts
+
+    def chronological_traffic(
+        self,
+        batch_size=CHRONOLOGICAL_BATCH_SIZE,
+        initial_timestamp_date=None,
+        random_seed=RANDOM_SEED,
+        iat_sampler=None,
+        sampling_backend=None,
+    ) -> Iterator[SyntheticTraffic]:
+        """Streams the requests of all users in global timestamp order, in batches of at most batch_size requests.
+
+        The traffic is generated hour by hour by a PopulationEngine. The requests of an hour always arrive within
+        it, thus sorting one hour at a time gives the global order and memory stays proportional to a single hour.
+        Timestamps are in seconds since the midnight of initial_timestamp_date.
+
+        When this distribution has no random_seed, the classes are drawn from random_seed, as the traffic, thus the
+        same arguments always stream the same population. The engine draws whole (class, hour) groups, not one
+        random generator per user, thus the stream is not a replay of the per-user files or the shards written by
+        generate_synthethic_users_and_traffic with the same seed, but traffic with the same distributions.
+        """
+        user_distribution = self
+        if self.random_seed is None:
+            user_distribution = UserDistribution(self.number_of_users, random_seed, self.exact_proportions)
+        engine = PopulationEngine.from_user_distribution(
+            user_distribution, initial_timestamp_date, random_seed, iat_sampler, sampling_backend=sampling_backend
+        )
+        for hour in engine.hours:
+            traffic = engine.generate_hour(hour)
+            order = np.argsort(traffic.timestamp, kind="stable")
+            for start in range(0, order.size, batch_size):
+                batch = order[start : start + batch_size]
+                yield SyntheticTraffic(*(column[batch] for column in traffic))
+
+
+def user_random_state(uid, random_seed=RANDOM_SEED) -> np.random.Generator:
+    # Child of the root SeedSequence(random_seed) dedicated to the user. It only depends on the uid, thus the
+    # traffic of a user is the same whatever the process, or the number of processes, generating it.
+    return np.random.default_rng(np.random.SeedSequence(random_seed, spawn_key=(uid,)))
+
+
+def _generate_chunk_of_users(chunk) -> Tuple[List[Tuple[int, str]], Dict[str, int], Optional[Dict], Dict[str, float]]:
+    # Runs in a worker process, returns the (uid, error) of the users whose traffic could not be generated, the
+    # IATSampler counters of the chunk, for the columnar formats the description of the shard written, and the
+    # number of requests and seconds spent in each of PIPELINE_STAGES
+    chunk_index, uids, klasses, options = chunk
+    iat_sampler = IATSampler(options["iat_sampling_method"])
+    statistics = dict((stage, 0.0) for stage in PIPELINE_STAGES)
+    statistics["requests"] = 0
+    failures = []
+    traffic = []
+    for uid, code in zip(uids.tolist(), klasses.tolist()):
+        try:
+            started = perf_counter()
+            user = User(
+                uid, USER_CLASSES[code], options["initial_timestamp_date"], iat_sampler, options["sampling_backend"]
+            )
+            user.generate_synthetic_traffic(user_random_state(uid, options["random_seed"]))
+            statistics["requests"] += user.request_file_sizes.size
+            if options["output_format"] == "text":
+                statistics["user_generation"] += perf_counter() - started
+                started = perf_counter()
+                user.write_traffic_to_file(options["volume_precision"])
+                statistics["file_writing"] += perf_counter() - started
+            else:
+                traffic.append(user.traffic())
+                statistics["user_generation"] += perf_counter() - started
+        except Exception as exception:
+            failures.append((uid, repr(exception)))
+    if not traffic:
+        return failures, iat_sampler.counters(), None, statistics
+    # The chunk is a whole shard, named after its uid range and sorted by time, thus the same whatever the number of
+    # workers
+    started = perf_counter()
+    traffic = SyntheticTraffic(*(np.concatenate(column) for column in zip(*traffic)))
+    order = np.lexsort((traffic.uid, traffic.timestamp))
+    traffic = SyntheticTraffic(*(column[order] for column in traffic))
+    statistics["ordering"] += perf_counter() - started
+    started = perf_counter()
+    timestamps = traffic.datetimes(options["initial_timestamp_date"])
+    statistics["timestamp_building"] += perf_counter() - started
+    started = perf_counter()
+    shard_path = ColumnarWriter(
+        path.join(USERS_DIRECTORY, COLUMNAR_DIRECTORY),
+        options["output_format"],
+        USER_CLASSES,
+        options["volume_precision"],
+    ).write(chunk_index, traffic.uid, timestamps, traffic.volume, traffic.klass)
+    shard = {"file": path.basename(shard_path), "requests": int(traffic.uid.size), "sha256": file_sha256(shard_path)}
+    statistics["file_writing"] += perf_counter() - started
+    return failures, iat_sampler.counters(), shard, statistics
+
+
+def _chunks_of_users(
+    user_generator, first_uid, last_uid, chunk_size, options
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray, dict]]:
+    # Chunks are aligned on multiples of chunk_size, thus a user always lands in the same chunk, whatever the range
+    uids, klasses = user_generator.class_codes(first_uid, last_uid)
+    start = 0
+    while start < uids.size:
+        end = start + chunk_size - int(uids[start]) % chunk_size
+        yield int(uids[start]) // chunk_size, uids[start:end], klasses[start:end], options
+        start = end
+
+
+def generate_synthethic_users_and_traffic(
+    number_of_users=NUMBER_OF_SYNTHETIC_USERS,
+    number_of_workers: Optional[int] = None,
+    chunk_size=USERS_PER_CHUNK,
+    random_seed=RANDOM_SEED,
+    iat_sampling_method="rejection",
+    output_format="text",
+    sampling_backend=SAMPLING_BACKEND,
+    first_uid=0,
+    last_uid: Optional[int] = None,
+    initial_timestamp_date: Optional[datetime] = None,
+    exact_class_proportions=False,
+    volume_precision=VOLUME_PRECISION,
+    time_index=False,
+    users_per_shard=USERS_PER_SHARD,
+) -> Dict:
+    """Generates the users from first_uid to last_uid (excluded) out of number_of_users, all of them by default.
+
+    The class and the traffic of a user only depend on its uid and random_seed, thus generating a range of users,
+    e.g., on one host out of many, gives the same traffic as for these users in a run generating all of them, as
+    long as initial_timestamp_date is the same. For the columnar formats, the shards written are listed with their
+    number of requests and checksum in a manifest, see shards.py to merge and verify them. Every shard holds the
+    users_per_shard users of an aligned uid range, whereas chunk_size is the number of users handed at once to a
+    worker for the text format. With
+    exact_class_proportions, the number of users of each class matches the empirical proportions, see
+    UserDistribution.class_counts. volume_precision is the number of digits after the decimal point of the volumes
+    in the text formats, all of them by default. With time_index and the 'npy' format, the shards are also merged
+    in a single trace indexed by class and minute, in TRACE_DIRECTORY, see trace_index.Trace to query time windows.
+
+    Returns the number of requests generated, the IATSampler counters and the seconds the workers spent in each of
+    PIPELINE_STAGES, summed over all of them.
+    """
+    if time_index and output_format != "npy":
+        raise Exception("The time index requires the npy output format")
+    if output_format not in OUTPUT_FORMATS:
+        raise Exception("The output format %s does not exist" % output_format)
+    last_uid = number_of_users if last_uid is None else last_uid
+    # The class of every user is drawn from its uid and random_seed, to make the experiment reproducible.
+    user_generator = UserDistribution(number_of_users, random_seed, exact_class_proportions)
+    options = {
+        "random_seed": random_seed,
+        "iat_sampling_method": iat_sampling_method,
+        "output_format": output_format,
+        "volume_precision": volume_precision,
+        "sampling_backend": sampling_backend,
+        "initial_timestamp_date": initial_timestamp_date if initial_timestamp_date else datetime.utcnow(),
+    }
+    # A fixed number of workers, one per core by default, pulls chunks of users until all of them are generated. A
+    # chunk of the columnar formats is a whole shard, written at once, thus the number of files does not depend on
+    # chunk_size
+    users_per_task = chunk_size if output_format == "text" else users_per_shard
+    if output_format != "text":
+        # The shards of a previous run of these users, e.g., with other shard sizes, would be loaded with the new ones
+        for removed_path in remove_manifests(path.join(USERS_DIRECTORY, COLUMNAR_DIRECTORY), first_uid, last_uid):
+            debug("Removed %s, written by a previous run" % removed_path)
+    failures = []
+    shards = []
+    iat_sampling_counters = dict((counter, 0) for counter in IATSampler().counters())
+    statistics = dict((stage, 0.0) for stage in PIPELINE_STAGES)
+    statistics["requests"] = 0
+    with Pool(number_of_workers or cpu_count(), worker_logging, (start_logging(),)) as pool:
+        for chunk_failures, chunk_counters, shard, chunk_statistics in pool.imap_unordered(
+            _generate_chunk_of_users, _chunks_of_users(user_generator, first_uid, last_uid, users_per_task, options)
+        ):
+            for uid, error in chunk_failures:
+                debug("Failed to generate synthetic traffic for user %s: %s" % (uid, error))
+            failures.extend(chunk_failures)
+            for counter, value in chunk_counters.items():
+                iat_sampling_counters[counter] += value
+            if shard is not None:
+                shards.append(shard)
+            for statistic, value in chunk_statistics.items():
+                statistics[statistic] += value
+    debug("IAT sampling (%s): %s" % (iat_sampling_method, iat_sampling_counters))
+    if failures:
+        raise Exception(
+            "The synthetic traffic of %d users could not be generated, e.g., user %s: %s"
+            % (len(failures), failures[0][0], failures[0][1])
+        )
+    if output_format != "text":
+        write_manifest(
+            path.join(USERS_DIRECTORY, COLUMNAR_DIRECTORY),
+            {
+                "number_of_users": number_of_users,
+                "first_uid": first_uid,
+                "last_uid": last_uid,
+                "random_seed": random_seed,
+                "exact_class_proportions": exact_class_proportions,
+                "users_per_shard": users_per_shard,
+                "initial_timestamp_date": options["initial_timestamp_date"].strftime("%Y-%m-%d"),
+                "shards": sorted(shards, key=lambda shard: shard["file"]),
+            },
+        )
+    if time_index:
+        from trace_index import build_trace
+
+        build_trace(
+            [
+                np.load(path.join(USERS_DIRECTORY, COLUMNAR_DIRECTORY, shard["file"]), mmap_mode="r")
+                for shard in shards
+            ],
+            path.join(USERS_DIRECTORY, TRACE_DIRECTORY),
+        )
+    return {
+        "requests": statistics.pop("requests"),
+        "iat_sampling": iat_sampling_counters,
+        "stage_seconds": statistics,
+    }
+
+
+def shard_range(number_of_users, shard_index, shard_count) -> Tuple[int, int]:
+    # Users [first_uid, last_uid) of shard shard_index out of shard_count, the shards cover all users evenly
+    if not 0 <= shard_index < shard_count:
+        raise Exception("The shard %d does not exist out of %d shards" % (shard_index, shard_count))
+    return number_of_users * shard_index // shard_count, number_of_users * (shard_index + 1) // shard_count
+
+
+def generate_shard(number_of_users, shard_index, shard_count, **options) -> Dict:
+    # Generates one shard out of shard_count of the users, options are the ones of generate_synthethic_users_and_traffic
+    first_uid, last_uid = shard_range(number_of_users, shard_index, shard_count)
+    return generate_synthethic_users_and_traffic(number_of_users, first_uid=first_uid, last_uid=last_uid, **options)
@@ -0,0 +1,165 @@
+# Synthetic Traffic Generator, Version 0.1
+# (c) 2015-2015, Inria, Palaiseau, France
+# Licensed under the GNU GPL, Version 3. For more details see LICENSE
+# Author: Eduardo Mucelli Rezende Oliveira (edumucelli@gmail.com)
+
+import json
+import sys
+from datetime import datetime, timedelta
+from multiprocessing import Pool, cpu_count
+from os import path, makedirs, replace
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+import generator
+from generator import IATSampler, PopulationEngine, SyntheticTraffic, USER_CLASSES
+from log import debug, start_logging, worker_logging
+from output import ColumnarWriter
+
+# Directory, within USERS_DIRECTORY, that contains the multi-day traffic, one sub-directory per day
+HORIZON_DIRECTORY = "horizon"
+# Users generated together by a worker, one shard file per day and checkpoint per shard
+USERS_PER_SHARD = 100000
+# Every hour of the day is generated over a horizon, hour 0 included
+HORIZON_HOURS = range(0, 24)
+
+
+def day_directory(output_directory, day) -> str:
+    return path.join(output_directory, "day-%04d" % day)
+
+
+def checkpoint_path(output_directory, shard) -> str:
+    return path.join(output_directory, "checkpoint-%05d.json" % shard)
+
+
+def write_json(file_path, content) -> None:
+    # Written aside and renamed, thus a crash never leaves a half-written file behind
+    with open(file_path + ".tmp", "w") as json_file:
+        json.dump(content, json_file, indent=2)
+    replace(file_path + ".tmp", file_path)
+
+
+def read_json(file_path) -> Optional[Dict]:
+    if not path.exists(file_path):
+        return None
+    with open(file_path) as json_file:
+        return json.load(json_file)
+
+
+def shard_seed(random_seed, day, shard) -> list:
+    # Entropy of the random generators of a shard on a day, thus every (day, shard) can be generated, or generated
+    # again after a crash, independently of all the others
+    return [random_seed, day, shard]
+
+
+def _generate_shard(task) -> int:
+    # Runs in a worker process, generates the days of a shard not generated yet, one at a time
+    shard, uids, klasses, options = task
+    start_date = datetime.strptime(options["start_date"], "%Y-%m-%d")
+    checkpoint = read_json(checkpoint_path(options["output_directory"], shard)) or {"completed_days": 0}
+    iat_sampler = IATSampler(options["iat_sampling_method"])
+    # The counters cover every day of the shard, including the ones generated before a resume
+    for counter, value in checkpoint.get("iat_sampling", {}).items():
+        setattr(iat_sampler, counter, value)
+    for day in range(checkpoint["completed_days"], options["number_of_days"]):
+        day_date = start_date + timedelta(days=day)
+        engine = PopulationEngine(
+            uids,
+            klasses,
+            day_date,
+            shard_seed(options["random_seed"], day, shard),
+            iat_sampler,
+            options["sampling_backend"],
+            HORIZON_HOURS,
+        )
+        traffic = engine.generate()
+        # Sorted by time, as the shards of generate_synthethic_users_and_traffic, thus they can be merged and indexed
+        order = np.lexsort((traffic.uid, traffic.timestamp))
+        traffic = SyntheticTraffic(*(column[order] for column in traffic))
+        ColumnarWriter(day_directory(options["output_directory"], day), "npy", USER_CLASSES).write(
+            shard, traffic.uid, traffic.datetimes(day_date), traffic.volume, traffic.klass
+        )
+        # The state of the random generators of the next day is fully given by its seed
+        write_json(
+            checkpoint_path(options["output_directory"], shard),
+            {
+                "shard": shard,
+                "uids": [int(uids[0]), int(uids[-1]) + 1],
+                "completed_days": day + 1,
+                "next_seed": shard_seed(options["random_seed"], day + 1, shard),
+                "iat_sampling": iat_sampler.counters(),
+            },
+        )
+        debug("Generated day %d of shard %d" % (day, shard))
+    return shard
+
+
+def _shards(klasses, users_per_shard, options) -> Iterator[Tuple[int, np.ndarray, np.ndarray, Dict]]:
+    for shard, start in enumerate(range(0, len(klasses), users_per_shard)):
+        uids = np.arange(start, min(start + users_per_shard, len(klasses)))
+        yield shard, uids, klasses[uids], options
+
+
+def generate_horizon(
+    number_of_users=generator.NUMBER_OF_SYNTHETIC_USERS,
+    number_of_days=1,
+    start_date: Optional[str] = None,
+    number_of_workers: Optional[int] = None,
+    users_per_shard=USERS_PER_SHARD,
+    random_seed=generator.RANDOM_SEED,
+    iat_sampling_method=generator.ENGINE_IAT_SAMPLING_METHOD,
+    sampling_backend=generator.SAMPLING_BACKEND,
+    output_directory=path.join(generator.USERS_DIRECTORY, HORIZON_DIRECTORY),
+) -> None:
+    """Generates number_of_days consecutive days of traffic, hours 0 to 23, as one npy shard per day and shard.
+
+    Each shard is generated day after day, thus memory does not grow with the horizon. After every day a shard
+    writes a checkpoint, running again with the same output_directory resumes from the last completed day of every
+    shard. start_date is in the format %Y-%m-%d, today by default.
+    """
+    makedirs(output_directory, exist_ok=True)
+    manifest_path = path.join(output_directory, "horizon.json")
+    manifest = {
+        "number_of_users": number_of_users,
+        "number_of_days": number_of_days,
+        "start_date": start_date,
+        "users_per_shard": users_per_shard,
+        "random_seed": random_seed,
+        "iat_sampling_method": iat_sampling_method,
+        "sampling_backend": sampling_backend,
+    }
+    previous_manifest = read_json(manifest_path)
+    if previous_manifest is not None:
+        if start_date is None:
+            manifest["start_date"] = previous_manifest["start_date"]
+        if manifest != previous_manifest:
+            raise Exception(
+                "The directory %s holds a horizon generated with other parameters: %s"
+                % (output_directory, previous_manifest)
+            )
+    elif start_date is None:
+        manifest["start_date"] = datetime.utcnow().strftime("%Y-%m-%d")
+    write_json(manifest_path, manifest)
+
+    # The class of every user is drawn from its uid and random_seed, to make the experiment reproducible.
+    _, klasses = generator.UserDistribution(number_of_users, random_seed).class_codes()
+    options = dict(manifest, output_directory=output_directory)
+    with Pool(number_of_workers or cpu_count(), worker_logging, (start_logging(),)) as pool:
+        for shard in pool.imap_unordered(_generate_shard, _shards(klasses, users_per_shard, options)):
+            debug("Shard %d completed" % shard)
+
+
+if __name__ == "__main__":
+    # python horizon.py <number of synthetic users> <number of days> [start date %Y-%m-%d] [number of workers]
+    number_of_synthetic_users = int(sys.argv[1]) if len(sys.argv) > 1 else generator.NUMBER_OF_SYNTHETIC_USERS
+    number_of_days = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    start_date = sys.argv[3] if len(sys.argv) > 3 else None
+    number_of_workers = int(sys.argv[4]) if len(sys.argv) > 4 else None
+
+    print("[+] Generating %d days of traffic of %d synthetic users" % (number_of_days, number_of_synthetic_users))
+    print(
+        "[+] Daily synthetic traffic shards will be stored in '%s'"
+        % path.join(".", generator.USERS_DIRECTORY, HORIZON_DIRECTORY)
+    )
+    generate_horizon(number_of_synthetic_users, number_of_days, start_date, number_of_workers)
@@ -1,14 +1,59 @@
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import Queue
 from os import path
 
+PROGRESS_LOG = path.abspath(path.join(".", "progress.log"))
+
 logger = logging.getLogger("Progress")
 logger.setLevel(logging.DEBUG)
 
-fh = logging.FileHandler(path.abspath(path.join(".", "progress.log")))
 formatter = logging.Formatter("%(asctime)s %(message)s", datefmt="%d-%m-%Y %H:%M:%S")
-fh.setFormatter(formatter)
-logger.addHandler(fh)
+
+# Every process sends its records through the queue, a single listener thread of the main process writes them
+_queue = None
+_listener = None
+
+
+def start_logging(file_path=PROGRESS_LOG) -> Queue:
+    # Starts the listener writing in file_path, once, and returns the queue to give to the worker processes
+    global _queue, _listener
+    if _queue is None:
+        _queue = Queue()
+        handler = logging.FileHandler(file_path)
+        handler.setFormatter(formatter)
+        _listener = QueueListener(_queue, handler)
+        _listener.start()
+        _log_to(_queue)
+        atexit.register(stop_logging)
+    return _queue
+
+
+def worker_logging(queue) -> None:
+    # Initializer of the worker processes, e.g., Pool(initializer=worker_logging, initargs=(start_logging(),))
+    global _queue
+    _queue = queue
+    _log_to(queue)
+
+
+def stop_logging() -> None:
+    # Writes the records still in the queue and stops the listener
+    global _queue, _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener.handlers[0].close()
+    _queue = None
+    _listener = None
+
+
+def _log_to(queue) -> None:
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(queue))
 
 
 def debug(message):
+    if _queue is None:
+        start_logging()
     logger.debug(message)
@@ -0,0 +1,246 @@
+# Synthetic Traffic Generator, Version 0.1
+# (c) 2015-2015, Inria, Palaiseau, France
+# Licensed under the GNU GPL, Version 3. For more details see LICENSE
+# Author: Eduardo Mucelli Rezende Oliveira (edumucelli@gmail.com)
+
+import hashlib
+import json
+from glob import glob
+from os import path, makedirs, remove
+from typing import Dict, Iterator, List, Sequence
+
+import numpy as np
+
+# Output formats of the synthetic traffic: 'text' is the legacy one file per user, see User.write_traffic_to_file,
+# 'dat' the same lines in one file per shard
+OUTPUT_FORMATS = ("text", "dat", "npy", "parquet")
+# Digits after the decimal point of the volumes in the text lines, None for the shortest representation that reads
+# back as the same float, as str() does
+VOLUME_PRECISION = None
+# Text lines formatted at once, then written in a single block
+TEXT_LINES_PER_BLOCK = 65536
+
+# Fixed-width record of one request in the 'npy' shards, memory-mappable with np.load(..., mmap_mode="r")
+TRAFFIC_RECORD = np.dtype(
+    [
+        ("timestamp", "datetime64[us]"),
+        ("uid", np.int64),
+        # In KiloBytes
+        ("volume", np.float64),
+        # Position of the user class in USER_CLASSES
+        ("klass", np.int8),
+    ]
+)
+
+
+def traffic_records(uids, timestamps, volumes, klasses) -> np.ndarray:
+    records = np.empty(len(uids), dtype=TRAFFIC_RECORD)
+    records["timestamp"] = timestamps
+    records["uid"] = uids
+    records["volume"] = volumes
+    records["klass"] = klasses
+    return records
+
+
+def text_lines(timestamps, uids, volumes, klasses, volume_precision=VOLUME_PRECISION) -> str:
+    """Lines 'date time uid volume class' of the requests, e.g., '2013-08-25 00:10:58 13 30.7411159743 HF', all of
+    them formatted by a single operation. uids and klasses are arrays, or a single value shared by all requests."""
+    if len(timestamps) == 0:
+        return ""
+    # The datetimes are truncated to the second, and joined to put the space between date and time all at once
+    datetimes = "\n".join(np.datetime_as_string(timestamps, unit="s").tolist()).replace("T", " ").split("\n")
+    volume_format = "%s" if volume_precision is None else "%%.%df" % volume_precision
+    line_format = "%s"
+    columns = [datetimes]
+    for column, value_format in ((uids, "%s"), (volumes, volume_format), (klasses, "%s")):
+        if np.ndim(column) == 0:
+            line_format += " " + str(column).replace("%", "%%")
+        else:
+            line_format += " " + value_format
+            columns.append(np.asarray(column).tolist())
+    line_format += "\n"
+    values = [None] * (len(columns) * len(datetimes))
+    for position, column in enumerate(columns):
+        values[position :: len(columns)] = column
+    return (line_format * len(datetimes)) % tuple(values)
+
+
+def write_text_traffic(
+    text_file,
+    timestamps,
+    uids,
+    volumes,
+    klasses,
+    volume_precision=VOLUME_PRECISION,
+    lines_per_block=TEXT_LINES_PER_BLOCK,
+) -> None:
+    # Writes the text lines of the requests in blocks of lines_per_block lines, each one formatted at once
+    for start in range(0, len(timestamps), lines_per_block):
+        block = slice(start, start + lines_per_block)
+        text_file.write(
+            text_lines(
+                timestamps[block],
+                uids if np.ndim(uids) == 0 else uids[block],
+                volumes[block],
+                klasses if np.ndim(klasses) == 0 else klasses[block],
+                volume_precision,
+            )
+        )
+
+
+class ColumnarWriter(object):
+    """Writes the synthetic traffic as shards of columnar files in 'directory', instead of one text file per user.
+
+    'npy' shards hold an array of TRAFFIC_RECORD, 'parquet' shards a table with the same columns, where the class is
+    a dictionary-encoded string column. Parquet requires pyarrow, that is only imported when that format is chosen.
+    'dat' shards hold the text lines of the per-user files, see text_lines, written in blocks.
+    """
+
+    def __init__(
+        self, directory, output_format="npy", user_classes: Sequence[str] = (), volume_precision=VOLUME_PRECISION
+    ):
+        if output_format not in ("dat", "npy", "parquet"):
+            raise Exception("The columnar output format %s does not exist" % output_format)
+        self.directory = directory
+        self.output_format = output_format
+        self.user_classes = list(user_classes)
+        self.volume_precision = volume_precision
+
+    def shard_path(self, shard) -> str:
+        return path.join(self.directory, "traffic-%05d.%s" % (shard, self.output_format))
+
+    def write(self, shard, uids, timestamps, volumes, klasses) -> str:
+        makedirs(self.directory, exist_ok=True)
+        shard_path = self.shard_path(shard)
+        if self.output_format == "npy":
+            np.save(shard_path, traffic_records(uids, timestamps, volumes, klasses))
+        elif self.output_format == "dat":
+            with open(shard_path, "w") as text_file:
+                write_text_traffic(
+                    text_file,
+                    timestamps,
+                    uids,
+                    volumes,
+                    np.asarray(self.user_classes)[klasses],
+                    self.volume_precision,
+                )
+        else:
+            self._write_parquet(shard_path, uids, timestamps, volumes, klasses)
+        return shard_path
+
+    def _write_parquet(self, shard_path, uids, timestamps, volumes, klasses) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception("The parquet output format requires pyarrow to be installed")
+        table = pyarrow.table(
+            {
+                "timestamp": pyarrow.array(np.asarray(timestamps, dtype="datetime64[us]")),
+                "uid": pyarrow.array(np.asarray(uids, dtype=np.int64)),
+                "volume": pyarrow.array(np.asarray(volumes, dtype=np.float64)),
+                "klass": pyarrow.DictionaryArray.from_arrays(
+                    pyarrow.array(np.asarray(klasses, dtype=np.int8)), pyarrow.array(self.user_classes)
+                ),
+            }
+        )
+        pyarrow.parquet.write_table(table, shard_path)
+
+
+def load_traffic(directory, mmap_mode="r") -> List[np.ndarray]:
+    # The 'npy' shards of 'directory' in order, memory-mapped by default so nothing is read until it is accessed. When
+    # the directory has manifests, only the shards they list are loaded, files left by other runs are ignored
+    manifests = read_manifests(directory)
+    if manifests:
+        shard_paths = [path.join(directory, shard["file"]) for manifest in manifests for shard in manifest["shards"]]
+    else:
+        shard_paths = glob(path.join(directory, "*.npy"))
+    shard_paths = sorted(shard_path for shard_path in shard_paths if shard_path.endswith(".npy"))
+    return [np.load(shard_path, mmap_mode=mmap_mode) for shard_path in shard_paths]
+
+
+def time_ordered_records(shards: List[np.ndarray], window_records=1 << 22) -> Iterator[np.ndarray]:
+    """Records of 'shards', each one sorted by timestamp, in batches ordered by timestamp, then uid. A batch holds
+    the records of a time window of window_records records on average, thus memory-mapped shards are only read one
+    window at a time. Raises an exception as soon as a shard turns out not to be sorted by timestamp."""
+    numbers = [number for number, shard in enumerate(shards) if len(shard) > 0]
+    shards = [shards[number] for number in numbers]
+    number_of_records = sum(len(shard) for shard in shards)
+    if number_of_records == 0:
+        return
+    # Shards are sorted by time, thus the records of a time window are a slice of each of them
+    first = min(shard["timestamp"][0] for shard in shards)
+    last = max(shard["timestamp"][-1] for shard in shards)
+    number_of_windows = -(-number_of_records // window_records)
+    window = max((last - first) // number_of_windows + np.timedelta64(1, "us"), np.timedelta64(1, "us"))
+    shard_timestamps = [shard["timestamp"] for shard in shards]
+    # Rows of each shard already yielded, the slice of the next window must start right after them
+    ends = [0] * len(shards)
+    window_start = first
+    while window_start <= last:
+        window_end = window_start + window
+        slices = []
+        for position, timestamps in enumerate(shard_timestamps):
+            start, end = np.searchsorted(timestamps, window_start), np.searchsorted(timestamps, window_end)
+            window_timestamps = timestamps[start:end]
+            # Only the rows of the window are read, checking them costs one more pass over memory already loaded
+            if start != ends[position] or (
+                end > start
+                and (
+                    window_timestamps[0] < window_start
+                    or window_timestamps[-1] >= window_end
+                    or np.any(window_timestamps[1:] < window_timestamps[:-1])
+                )
+            ):
+                raise Exception("The shard %d is not sorted by timestamp" % numbers[position])
+            ends[position] = end
+            slices.append(shards[position][start:end])
+        records = np.concatenate(slices)
+        yield records[np.lexsort((records["uid"], records["timestamp"]))]
+        window_start = window_end
+    for position, shard in enumerate(shards):
+        if ends[position] != len(shard):
+            raise Exception("The shard %d is not sorted by timestamp" % numbers[position])
+
+
+def file_sha256(file_path) -> str:
+    checksum = hashlib.sha256()
+    with open(file_path, "rb") as shard_file:
+        for block in iter(lambda: shard_file.read(1 << 20), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+
+def write_manifest(directory, manifest: Dict) -> str:
+    # Manifest of the shards written for the users [first_uid, last_uid), one per range, thus one per host
+    manifest_path = path.join(directory, "manifest-%010d-%010d.json" % (manifest["first_uid"], manifest["last_uid"]))
+    makedirs(directory, exist_ok=True)
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest_path
+
+
+def remove_manifests(directory, first_uid, last_uid) -> List[str]:
+    # Removes the manifests of 'directory' covering any of the users [first_uid, last_uid), and the shards they list,
+    # before these users are written again, returns the files removed
+    removed = []
+    for manifest_path in sorted(glob(path.join(directory, "manifest-*.json"))):
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest["first_uid"] < last_uid and first_uid < manifest["last_uid"]:
+            for shard in manifest["shards"]:
+                shard_path = path.join(directory, shard["file"])
+                if path.exists(shard_path):
+                    remove(shard_path)
+                    removed.append(shard_path)
+            remove(manifest_path)
+            removed.append(manifest_path)
+    return removed
+
+
+def read_manifests(directory) -> List[Dict]:
+    manifests = []
+    for manifest_path in sorted(glob(path.join(directory, "manifest-*.json"))):
+        with open(manifest_path) as manifest_file:
+            manifests.append(json.load(manifest_file))
+    return manifests
@@ -0,0 +1,342 @@
+# Synthetic Traffic Generator, Version 0.1
+# (c) 2015-2015, Inria, Palaiseau, France
+# Licensed under the GNU GPL, Version 3. For more details see LICENSE
+# Author: Eduardo Mucelli Rezende Oliveira (edumucelli@gmail.com)
+
+import asyncio
+import sys
+from typing import Dict, Iterable
+
+import generator
+from generator import SyntheticTraffic
+
+# Bytes sent per KiloByte of volume, and the largest payload sent for a single session
+BYTES_PER_KILOBYTE = 1024
+MAX_PAYLOAD_SIZE = 1024 * 1024
+# Largest UDP datagram, bigger payloads are split
+MAX_DATAGRAM_SIZE = 65507
+# Sessions being sent at the same time, and connections kept open to the TCP and HTTP endpoints
+MAX_CONCURRENT_SESSIONS = 10000
+NUMBER_OF_CONNECTIONS = 64
+
+
+class ReplayStatistics(object):
+    """Measures the replay, to tell whether the generator or the system under test is the bottleneck.
+
+    The scheduling lag is how late a session is handed to the sink compared to its (accelerated) timestamp, counted
+    from the first session, it grows when the replay itself cannot keep up. The session wait is how long a due
+    session waits for one of the max_concurrent_sessions slots, and the send latency how long the sink takes to send
+    a session, both grow when the system under test cannot keep up.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.failures = 0
+        self.scheduling_lag_sum = 0.0
+        self.scheduling_lag_max = 0.0
+        self.session_wait_sum = 0.0
+        self.session_wait_max = 0.0
+        self.send_latency_sum = 0.0
+        self.send_latency_max = 0.0
+        self.started = None
+        self.finished = None
+
+    def add_scheduling_lag(self, lag) -> None:
+        self.scheduling_lag_sum += lag
+        self.scheduling_lag_max = max(self.scheduling_lag_max, lag)
+
+    def add_session_wait(self, wait) -> None:
+        self.session_wait_sum += wait
+        self.session_wait_max = max(self.session_wait_max, wait)
+
+    def add_send(self, number_of_bytes, latency) -> None:
+        self.requests += 1
+        self.bytes += number_of_bytes
+        self.send_latency_sum += latency
+        self.send_latency_max = max(self.send_latency_max, latency)
+
+    def report(self) -> Dict[str, float]:
+        elapsed = (self.finished - self.started) if self.started is not None and self.finished is not None else 0.0
+        scheduled = self.requests + self.failures
+        return {
+            "requests": self.requests,
+            "failures": self.failures,
+            "bytes": self.bytes,
+            "elapsed_seconds": elapsed,
+            "requests_per_second": self.requests / elapsed if elapsed > 0 else 0.0,
+            "bytes_per_second": self.bytes / elapsed if elapsed > 0 else 0.0,
+            "mean_scheduling_lag_seconds": self.scheduling_lag_sum / scheduled if scheduled else 0.0,
+            "max_scheduling_lag_seconds": self.scheduling_lag_max,
+            "mean_session_wait_seconds": self.session_wait_sum / scheduled if scheduled else 0.0,
+            "max_session_wait_seconds": self.session_wait_max,
+            "mean_send_latency_seconds": self.send_latency_sum / self.requests if self.requests else 0.0,
+            "max_send_latency_seconds": self.send_latency_max,
+        }
+
+
+class Sink(object):
+    """Where the replayed sessions are sent, one payload per session sized by the session volume."""
+
+    async def open(self) -> None:
+        pass
+
+    async def send(self, payload: memoryview) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemorySink(Sink):
+    """In-process stand-in for the system under test, it only counts what it receives, optionally after a delay."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.requests = 0
+        self.bytes = 0
+
+    async def send(self, payload: memoryview) -> None:
+        if self.delay > 0:
+            await asyncio.sleep(self.delay)
+        self.requests += 1
+        self.bytes += len(payload)
+
+
+class TCPSink(Sink):
+    """Writes the payloads on a pool of persistent connections to host:port. A connection is closed after an error,
+    or when the endpoint closes it, and replaced by a new one the next time it is picked."""
+
+    def __init__(self, host, port, number_of_connections=NUMBER_OF_CONNECTIONS):
+        self.host = host
+        self.port = port
+        self.number_of_connections = number_of_connections
+        self.connections = None
+
+    async def open(self) -> None:
+        self.connections = asyncio.Queue()
+        for _ in range(self.number_of_connections):
+            self.connections.put_nowait(await asyncio.open_connection(self.host, self.port))
+
+    async def send(self, payload: memoryview) -> None:
+        # A slot of the pool holds a (reader, writer) connection, or None once it was closed
+        connection = await self.connections.get()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(self.host, self.port)
+            if not await self.exchange(*connection, payload):
+                connection = self._close(connection)
+        except BaseException:
+            connection = self._close(connection)
+            raise
+        finally:
+            self.connections.put_nowait(connection)
+
+    async def exchange(self, reader, writer, payload: memoryview) -> bool:
+        # Sends the payload, returns whether the connection can be used again
+        writer.write(payload)
+        await writer.drain()
+        return True
+
+    @staticmethod
+    def _close(connection) -> None:
+        if connection is not None:
+            connection[1].close()
+        return None
+
+    async def close(self) -> None:
+        while not self.connections.empty():
+            connection = self.connections.get_nowait()
+            if connection is not None:
+                connection[1].close()
+                await connection[1].wait_closed()
+
+
+class HTTPSink(TCPSink):
+    """POSTs the payloads to http://host:port/path on a pool of keep-alive connections, waiting for each response."""
+
+    def __init__(self, host, port, path="/", number_of_connections=NUMBER_OF_CONNECTIONS):
+        TCPSink.__init__(self, host, port, number_of_connections)
+        self.path = path
+
+    async def exchange(self, reader, writer, payload: memoryview) -> bool:
+        writer.write(
+            (
+                "POST %s HTTP/1.1\r\nHost: %s:%s\r\nContent-Type: application/octet-stream\r\n"
+                "Content-Length: %d\r\n\r\n" % (self.path, self.host, self.port, len(payload))
+            ).encode("ascii")
+        )
+        writer.write(payload)
+        await writer.drain()
+        headers = await reader.readuntil(b"\r\n\r\n")
+        status_line, _, header_lines = headers.partition(b"\r\n")
+        version, status = status_line.split(b" ", 2)[:2]
+        status = int(status)
+        fields = {}
+        for header in header_lines.split(b"\r\n"):
+            name, _, value = header.partition(b":")
+            fields[name.strip().lower()] = value.strip().lower()
+        # HTTP/1.1 keeps the connection open unless told otherwise, HTTP/1.0 only when told to
+        connection = fields.get(b"connection", b"keep-alive" if version == b"HTTP/1.1" else b"close")
+        reusable = connection != b"close"
+        if fields.get(b"transfer-encoding", b"").endswith(b"chunked"):
+            await self._read_chunked_body(reader)
+        elif b"content-length" in fields:
+            await reader.readexactly(int(fields[b"content-length"]))
+        elif status >= 200 and status not in (204, 304):
+            # Without a length, the body goes on until the endpoint closes the connection
+            await reader.read()
+            reusable = False
+        if status >= 400:
+            raise Exception("The HTTP endpoint answered %d" % status)
+        return reusable
+
+    @staticmethod
+    async def _read_chunked_body(reader) -> None:
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";", 1)[0], 16)
+            if size == 0:
+                break
+            await reader.readexactly(size + 2)
+        # Trailer fields, up to the empty line
+        while await reader.readuntil(b"\r\n") != b"\r\n":
+            pass
+
+
+class UDPSink(Sink):
+    """Sends the payloads as datagrams to host:port, split in MAX_DATAGRAM_SIZE datagrams."""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.transport = None
+
+    async def open(self) -> None:
+        self.transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=(self.host, self.port)
+        )
+
+    async def send(self, payload: memoryview) -> None:
+        for start in range(0, max(len(payload), 1), MAX_DATAGRAM_SIZE):
+            self.transport.sendto(payload[start : start + MAX_DATAGRAM_SIZE])
+
+    async def close(self) -> None:
+        self.transport.close()
+
+
+class Replayer(object):
+    """Replays chronologically ordered traffic against a sink, at wall-clock speed times 'speedup'.
+
+    A single coroutine walks through the sessions and hands each one to the sink when its timestamp is due, thus
+    the number of synthetic users does not matter, only the number of sessions in flight, which is bounded by
+    max_concurrent_sessions.
+    """
+
+    def __init__(
+        self,
+        sink: Sink,
+        speedup=1.0,
+        max_concurrent_sessions=MAX_CONCURRENT_SESSIONS,
+        bytes_per_kilobyte=BYTES_PER_KILOBYTE,
+        max_payload_size=MAX_PAYLOAD_SIZE,
+    ):
+        self.sink = sink
+        self.speedup = speedup
+        self.max_concurrent_sessions = max_concurrent_sessions
+        self.bytes_per_kilobyte = bytes_per_kilobyte
+        self.max_payload_size = max_payload_size
+        self.statistics = ReplayStatistics()
+
+    async def replay(self, traffic_batches: Iterable[SyntheticTraffic]) -> ReplayStatistics:
+        loop = asyncio.get_running_loop()
+        sessions = asyncio.Semaphore(self.max_concurrent_sessions)
+        in_flight = set()
+        # Every payload is a slice of the same buffer, nothing is allocated per session
+        payload = memoryview(bytes(self.max_payload_size))
+        first_timestamp = None
+        await self.sink.open()
+        try:
+            # The next batch is generated in a thread while the current one is replayed
+            batches = iter(traffic_batches)
+            next_traffic = loop.run_in_executor(None, next, batches, None)
+            while True:
+                traffic = await next_traffic
+                if traffic is None:
+                    break
+                next_traffic = loop.run_in_executor(None, next, batches, None)
+                if traffic.timestamp.size == 0:
+                    continue
+                if first_timestamp is None:
+                    # The clock starts with the first session, generating the first batch may take a while and its
+                    # sessions would otherwise all be late, sent in a burst that is not in the traffic
+                    first_timestamp = float(traffic.timestamp[0])
+                    self.statistics.started = loop.time()
+                for timestamp, volume in zip(traffic.timestamp.tolist(), traffic.volume.tolist()):
+                    due = self.statistics.started + (timestamp - first_timestamp) / self.speedup
+                    delay = due - loop.time()
+                    # Behind schedule, the sessions already created still get to run before the next one
+                    await asyncio.sleep(max(delay, 0))
+                    # The lag is measured before waiting for a free slot, that wait is the sink's backpressure
+                    handed = loop.time()
+                    self.statistics.add_scheduling_lag(max(handed - due, 0.0))
+                    await sessions.acquire()
+                    self.statistics.add_session_wait(loop.time() - handed)
+                    size = min(int(volume * self.bytes_per_kilobyte), self.max_payload_size)
+                    task = loop.create_task(self._send(payload[:size]))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                    task.add_done_callback(lambda _: sessions.release())
+            if in_flight:
+                await asyncio.gather(*in_flight)
+            self.statistics.finished = loop.time()
+        finally:
+            await self.sink.close()
+        return self.statistics
+
+    async def _send(self, payload: memoryview) -> None:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        try:
+            await self.sink.send(payload)
+        except Exception:
+            self.statistics.failures += 1
+            return
+        self.statistics.add_send(len(payload), loop.time() - started)
+
+
+def replay(
+    traffic_batches: Iterable[SyntheticTraffic], sink: Sink, speedup=1.0, **replayer_options
+) -> Dict[str, float]:
+    return asyncio.run(Replayer(sink, speedup, **replayer_options).replay(traffic_batches)).report()
+
+
+def create_sink(protocol, host, port) -> Sink:
+    if protocol == "tcp":
+        return TCPSink(host, port)
+    if protocol == "udp":
+        return UDPSink(host, port)
+    if protocol == "http":
+        return HTTPSink(host, port)
+    if protocol == "memory":
+        return MemorySink()
+    raise Exception("The replay protocol %s does not exist" % protocol)
+
+
+if __name__ == "__main__":
+    # python replay.py <number of synthetic users> <speedup> <tcp|udp|http|memory> [host] [port] [IAT sampling method]
+    number_of_synthetic_users = int(sys.argv[1]) if len(sys.argv) > 1 else generator.NUMBER_OF_SYNTHETIC_USERS
+    speedup = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    protocol = sys.argv[3] if len(sys.argv) > 3 else "memory"
+    host = sys.argv[4] if len(sys.argv) > 4 else "127.0.0.1"
+    port = int(sys.argv[5]) if len(sys.argv) > 5 else 8080
+    # Bounded by default, with 'rejection' generating the traffic is slower than replaying it
+    iat_sampling_method = sys.argv[6] if len(sys.argv) > 6 else generator.ENGINE_IAT_SAMPLING_METHOD
+
+    print("[+] Replaying %d synthetic users %gx faster than real time" % (number_of_synthetic_users, speedup))
+    user_generator = generator.UserDistribution(number_of_synthetic_users, generator.RANDOM_SEED)
+    for name, value in replay(
+        user_generator.chronological_traffic(iat_sampler=generator.IATSampler(iat_sampling_method)),
+        create_sink(protocol, host, port),
+        speedup,
+    ).items():
+        print("[+] %s: %s" % (name, value))
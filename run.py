@@ -7,10 +7,24 @@ if __name__ == "__main__":
         number_of_synthetic_users = int(sys.argv[1])
     else:
         number_of_synthetic_users = generator.NUMBER_OF_SYNTHETIC_USERS
+    # Number of worker processes, one per core if not given
+    number_of_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    # 'text' (one file per user), 'dat' (shards of text lines), 'npy' or 'parquet' (shards of columnar files)
+    output_format = sys.argv[3] if len(sys.argv) > 3 else "text"
+    # Users of every shard of the columnar formats
+    users_per_shard = int(sys.argv[4]) if len(sys.argv) > 4 else generator.USERS_PER_SHARD
 
     print("[+] Generating %d synthetic users and their respective hourly traffic" % number_of_synthetic_users)
-    print(
-        "[+] Per-user synthetic traffic will be stored in '%s'"
-        % path.join(".", generator.USERS_DIRECTORY, generator.SYNTHETIC_DIRECTORY)
+    if output_format == "text":
+        print(
+            "[+] Per-user synthetic traffic will be stored in '%s'"
+            % path.join(".", generator.USERS_DIRECTORY, generator.SYNTHETIC_DIRECTORY)
+        )
+    else:
+        print(
+            "[+] Synthetic traffic shards will be stored in '%s'"
+            % path.join(".", generator.USERS_DIRECTORY, generator.COLUMNAR_DIRECTORY)
+        )
+    generator.generate_synthethic_users_and_traffic(
+        number_of_synthetic_users, number_of_workers, output_format=output_format, users_per_shard=users_per_shard
     )
-    generator.generate_synthethic_users_and_traffic(number_of_synthetic_users)
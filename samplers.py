@@ -0,0 +1,111 @@
+# Synthetic Traffic Generator, Version 0.1
+# (c) 2015-2015, Inria, Palaiseau, France
+# Licensed under the GNU GPL, Version 3. For more details see LICENSE
+# Author: Eduardo Mucelli Rezende Oliveira (edumucelli@gmail.com)
+
+import numpy as np
+
+# Backends building the distributions of a TrafficModel. 'numpy' samples directly with numpy, 'scipy' is the
+# original implementation with scipy.stats frozen distributions, scipy is only imported when it is chosen.
+SAMPLING_BACKENDS = ("numpy", "scipy")
+
+
+class NumpyDistribution(object):
+    """Frozen distribution sampled directly with numpy, with the rvs() interface of the scipy frozen distributions.
+
+    random_state is a numpy.random.Generator or RandomState, if None the global numpy random state is used as scipy
+    does, thus numpy.random.seed() still makes the samples reproducible.
+    """
+
+    __slots__ = ()
+
+    def rvs(self, size=None, random_state=None):
+        return self.sample(np.random if random_state is None else random_state, size)
+
+    def sample(self, random_state, size):
+        raise NotImplementedError
+
+
+class NumpyWeibull(NumpyDistribution):
+    # Same as scipy.stats.weibull_min(c, loc=loc, scale=scale)
+    __slots__ = ("c", "loc", "scale")
+
+    def __init__(self, c, loc, scale):
+        self.c, self.loc, self.scale = c, loc, scale
+
+    def sample(self, random_state, size):
+        return self.loc + self.scale * random_state.weibull(self.c, size)
+
+
+class NumpyGamma(NumpyDistribution):
+    # Same as scipy.stats.gamma(shape, loc=loc, scale=scale)
+    __slots__ = ("shape", "loc", "scale")
+
+    def __init__(self, shape, loc, scale):
+        self.shape, self.loc, self.scale = shape, loc, scale
+
+    def sample(self, random_state, size):
+        return self.loc + random_state.gamma(self.shape, self.scale, size)
+
+
+class NumpyLognorm(NumpyDistribution):
+    # Same as scipy.stats.lognorm(shape, loc=loc, scale=scale), i.e., loc + scale * exp(shape * N(0, 1))
+    __slots__ = ("shape", "loc", "scale")
+
+    def __init__(self, shape, loc, scale):
+        self.shape, self.loc, self.scale = shape, loc, scale
+
+    def sample(self, random_state, size):
+        return self.loc + self.scale * random_state.lognormal(0.0, self.shape, size)
+
+
+class NumpyNbinom(NumpyDistribution):
+    # Same as scipy.stats.nbinom(n, p)
+    __slots__ = ("n", "p")
+
+    def __init__(self, n, p):
+        self.n, self.p = n, p
+
+    def sample(self, random_state, size):
+        return random_state.negative_binomial(self.n, self.p, size)
+
+
+def nbinom_probability(parameters) -> float:
+    # From R's documentation: An alternative parametrization (often used in ecology) is by the
+    #  _mean_ 'mu', and 'size', the _dispersion parameter_, where 'prob' = 'size/(size+mu)'
+    return parameters["size"] / (parameters["size"] + parameters["mu"])
+
+
+def numpy_distribution(name, parameters) -> NumpyDistribution:
+    if name == "Weibull":
+        return NumpyWeibull(parameters["c"], parameters["loc"], parameters["scale"])
+    if name == "Gamma":
+        return NumpyGamma(parameters["shape"], parameters["loc"], 1.0 / parameters["rate"])
+    if name == "Log-norm":
+        return NumpyLognorm(parameters["shape"], parameters["loc"], parameters["scale"])
+    if name == "Neg-binomial":
+        return NumpyNbinom(parameters["size"], nbinom_probability(parameters))
+    raise Exception("The distribution %s does not exist" % name)
+
+
+def scipy_distribution(name, parameters):
+    from scipy.stats import gamma, weibull_min, lognorm, nbinom
+
+    if name == "Weibull":
+        return weibull_min(parameters["c"], loc=parameters["loc"], scale=parameters["scale"])
+    if name == "Gamma":
+        return gamma(parameters["shape"], loc=parameters["loc"], scale=1.0 / parameters["rate"])
+    if name == "Log-norm":
+        return lognorm(parameters["shape"], loc=parameters["loc"], scale=parameters["scale"])
+    if name == "Neg-binomial":
+        return nbinom(parameters["size"], nbinom_probability(parameters))
+    raise Exception("The distribution %s does not exist" % name)
+
+
+def frozen_distribution(name, parameters, backend="numpy"):
+    # Distribution 'name' of the data file with the given parameters, an object with an rvs(size, random_state) method
+    if backend == "numpy":
+        return numpy_distribution(name, parameters)
+    if backend == "scipy":
+        return scipy_distribution(name, parameters)
+    raise Exception("The sampling backend %s does not exist" % backend)
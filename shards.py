@@ -0,0 +1,122 @@
+# Synthetic Traffic Generator, Version 0.1
+# (c) 2015-2015, Inria, Palaiseau, France
+# Licensed under the GNU GPL, Version 3. For more details see LICENSE
+# Author: Eduardo Mucelli Rezende Oliveira (edumucelli@gmail.com)
+
+import json
+import sys
+from datetime import datetime
+from os import path
+from typing import Dict, List
+
+import numpy as np
+
+import generator
+from output import TRAFFIC_RECORD, file_sha256, read_manifests, time_ordered_records
+
+# Records merged at once, on average, memory of the merge is proportional to it
+MERGE_WINDOW_RECORDS = 1 << 22
+
+
+def verify_shards(directories: List[str]) -> List[Dict]:
+    """Checks that the manifests of 'directories' cover every user exactly once and that every shard they list is
+    present, with the number of requests and the checksum listed. Returns the manifests."""
+    manifests = []
+    for directory in directories:
+        for manifest in read_manifests(directory):
+            manifest["directory"] = directory
+            manifests.append(manifest)
+    if not manifests:
+        raise Exception("There is no shard manifest in %s" % ", ".join(directories))
+
+    for field in ("number_of_users", "random_seed", "exact_class_proportions", "initial_timestamp_date"):
+        values = set(manifest[field] for manifest in manifests)
+        if len(values) > 1:
+            raise Exception("The shards were generated with different %s: %s" % (field, sorted(values)))
+
+    next_uid = 0
+    for manifest in sorted(manifests, key=lambda manifest: manifest["first_uid"]):
+        if manifest["first_uid"] != next_uid:
+            raise Exception("The users from %d to %d are missing or duplicated" % (next_uid, manifest["first_uid"]))
+        next_uid = manifest["last_uid"]
+    if next_uid != manifests[0]["number_of_users"]:
+        raise Exception("The users from %d to %d are missing" % (next_uid, manifests[0]["number_of_users"]))
+
+    for manifest in manifests:
+        for shard in manifest["shards"]:
+            shard_path = path.join(manifest["directory"], shard["file"])
+            if not shard["file"].endswith(".npy"):
+                raise Exception("Only npy shards can be merged, %s is not one" % shard_path)
+            if not path.exists(shard_path):
+                raise Exception("The shard %s is missing" % shard_path)
+            if file_sha256(shard_path) != shard["sha256"]:
+                raise Exception("The checksum of the shard %s does not match its manifest" % shard_path)
+            if len(np.load(shard_path, mmap_mode="r")) != shard["requests"]:
+                raise Exception("The number of requests of the shard %s does not match its manifest" % shard_path)
+    return manifests
+
+
+def merge_shards(directories: List[str], output_file) -> Dict:
+    """Verifies the shards of 'directories', e.g., one per host, and merges them in a single npy file of
+    TRAFFIC_RECORD ordered by timestamp, then uid. The same users give the same file, thus the same checksum,
+    whatever the way they were split in shards."""
+    manifests = verify_shards(directories)
+    shards = [
+        np.load(path.join(manifest["directory"], shard["file"]), mmap_mode="r")
+        for manifest in manifests
+        for shard in manifest["shards"]
+    ]
+    number_of_requests = sum(len(shard) for shard in shards)
+    merged = np.lib.format.open_memmap(output_file, mode="w+", dtype=TRAFFIC_RECORD, shape=(number_of_requests,))
+    position = 0
+    for records in time_ordered_records(shards, MERGE_WINDOW_RECORDS):
+        merged[position : position + len(records)] = records
+        position += len(records)
+    if position != number_of_requests:
+        raise Exception("%d requests were merged out of %d" % (position, number_of_requests))
+    merged.flush()
+    del merged
+
+    summary = {
+        "number_of_users": manifests[0]["number_of_users"],
+        "random_seed": manifests[0]["random_seed"],
+        "exact_class_proportions": manifests[0]["exact_class_proportions"],
+        "initial_timestamp_date": manifests[0]["initial_timestamp_date"],
+        "requests": number_of_requests,
+        "shards": sum(len(manifest["shards"]) for manifest in manifests),
+        "sha256": file_sha256(output_file),
+    }
+    with open(output_file + ".json", "w") as summary_file:
+        json.dump(summary, summary_file, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    # python shards.py generate <number of users> <shard index> <shard count> <date %Y-%m-%d> [number of workers]
+    # python shards.py merge <output file> <shard directory> [shard directory ...]
+    if len(sys.argv) > 5 and sys.argv[1] == "generate":
+        number_of_synthetic_users, shard_index, shard_count = int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+        first_uid, last_uid = generator.shard_range(number_of_synthetic_users, shard_index, shard_count)
+        print("[+] Generating the synthetic users %d to %d" % (first_uid, last_uid - 1))
+        generator.generate_shard(
+            number_of_synthetic_users,
+            shard_index,
+            shard_count,
+            number_of_workers=int(sys.argv[6]) if len(sys.argv) > 6 else None,
+            output_format="npy",
+            initial_timestamp_date=datetime.strptime(sys.argv[5], "%Y-%m-%d"),
+        )
+        print(
+            "[+] Shards and their manifest are stored in '%s'"
+            % path.join(".", generator.USERS_DIRECTORY, generator.COLUMNAR_DIRECTORY)
+        )
+    elif len(sys.argv) > 3 and sys.argv[1] == "merge":
+        merge_summary = merge_shards(sys.argv[3:], sys.argv[2])
+        print("[+] Merged %d requests of %d shards" % (merge_summary["requests"], merge_summary["shards"]))
+        print("[+] sha256 %s" % merge_summary["sha256"])
+    else:
+        print(
+            "Usage: python shards.py generate <number of users> <shard index> <shard count> <date> [workers]\n"
+            "       python shards.py merge <output file> <shard directory> [shard directory ...]"
+        )
+        sys.exit(1)
@@ -0,0 +1,24 @@
+import sys
+from os import path
+
+import pytest
+
+# The modules of the generator are at the root of the repository, run.py and the other scripts import them from there
+sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+
+import generator  # noqa: E402
+import log  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def progress_log(tmp_path_factory):
+    # The progress of the worker processes is logged out of the repository
+    log.start_logging(str(tmp_path_factory.mktemp("log") / "progress.log"))
+    yield
+    log.stop_logging()
+
+
+@pytest.fixture(autouse=True)
+def bounded_iat_resampling(monkeypatch):
+    # Users whose IATs hardly ever fit in an hour are given up sooner, the forked worker processes inherit it
+    monkeypatch.setattr(generator, "MAX_IAT_RESAMPLING_ATTEMPTS", 200)
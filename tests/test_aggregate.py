@@ -0,0 +1,39 @@
+from datetime import datetime
+from os import path
+
+import numpy as np
+import pytest
+
+import aggregate
+import generator
+from output import load_traffic
+
+DAY = datetime(2013, 8, 25)
+
+
+@pytest.mark.parametrize("exact_class_proportions", (False, True))
+def test_aggregate_load_is_the_histogram_of_the_written_traffic(tmp_path, monkeypatch, exact_class_proportions):
+    monkeypatch.chdir(tmp_path)
+    generator.generate_synthethic_users_and_traffic(
+        500,
+        2,
+        output_format="npy",
+        initial_timestamp_date=DAY,
+        exact_class_proportions=exact_class_proportions,
+    )
+    records = np.concatenate(load_traffic(path.join(generator.USERS_DIRECTORY, generator.COLUMNAR_DIRECTORY)))
+    written = aggregate.LoadHistogram()
+    written.add(
+        generator.SyntheticTraffic(
+            records["uid"],
+            (records["timestamp"] - np.datetime64(DAY, "us")) / np.timedelta64(1, "s"),
+            records["volume"],
+            records["klass"],
+        )
+    )
+    for users_per_chunk in (64, 500):
+        load = aggregate.aggregate_load(
+            500, number_of_workers=2, users_per_chunk=users_per_chunk, exact_class_proportions=exact_class_proportions
+        )
+        assert np.array_equal(load.requests, written.requests)
+        assert np.allclose(load.volume, written.volume)
@@ -0,0 +1,153 @@
+import hashlib
+from datetime import datetime
+
+import numpy as np
+import pytest
+from scipy import stats
+
+import generator
+from samplers import NumpyGamma, frozen_distribution
+
+DAY = datetime(2013, 8, 25)
+SEED = 20150101
+DRAWS = 20000
+# Cap of the rejection sampler of the generator, the tests run with a lower one, see conftest.py
+PRODUCTION_MAX_IAT_RESAMPLING_ATTEMPTS = generator.MAX_IAT_RESAMPLING_ATTEMPTS
+# Digest of the traffic generated by the scipy implementation before the numpy backend was added, with the cap of
+# the generator, for users of every class whose IATs all fit in their hour before reaching it
+SCIPY_USERS = (0, 2, 3, 4, 5, 7, 12, 13, 18)
+SCIPY_USERS_SHA256 = "23a7101c27c7d77acad9ac82cef79d1397c666aaa00dcdad4f988e7be78744f5"
+# Digest of the traffic generated by the engine with the same implementation, with a cap of 200 attempts that
+# truncates some of the hours, thus covers the requests removed once the cap is reached
+SCIPY_ENGINE_MAX_IAT_RESAMPLING_ATTEMPTS = 200
+SCIPY_ENGINE_SHA256 = "8252908873a0b88a5356cc3a3f4716219a87407e00daa8d6492dfe1745d4d638"
+
+
+def model_hours(kind, klass):
+    # The first peak hour of the model and the first off-peak one
+    peak_hours = generator.traffic_model_parameters().parameters[kind][klass]["peak_hours"]
+    return peak_hours[0], [hour for hour in range(1, 24) if hour not in peak_hours][0]
+
+
+def model_distributions(kind, klass, hour):
+    parameters = generator.traffic_model_parameters().find(kind, klass, hour)
+    return (
+        frozen_distribution(parameters["distribution"], parameters, "numpy"),
+        frozen_distribution(parameters["distribution"], parameters, "scipy"),
+    )
+
+
+def traffic_sha256(columns) -> str:
+    checksum = hashlib.sha256()
+    for column in columns:
+        checksum.update(np.ascontiguousarray(column).tobytes())
+    return checksum.hexdigest()
+
+
+@pytest.mark.parametrize("period", (0, 1), ids=("peak", "off_peak"))
+@pytest.mark.parametrize("klass", generator.USER_CLASSES)
+@pytest.mark.parametrize("kind", ("volume", "iat"))
+def test_numpy_backend_has_the_distribution_of_scipy(kind, klass, period):
+    numpy_distribution, scipy_distribution = model_distributions(kind, klass, model_hours(kind, klass)[period])
+    numpy_samples = numpy_distribution.rvs(size=DRAWS, random_state=np.random.default_rng(1))
+    scipy_samples = scipy_distribution.rvs(size=DRAWS, random_state=np.random.default_rng(2))
+    assert stats.ks_2samp(numpy_samples, scipy_samples).pvalue > 0.001
+
+
+@pytest.mark.parametrize("period", (0, 1), ids=("peak", "off_peak"))
+@pytest.mark.parametrize("klass", generator.USER_CLASSES)
+def test_numpy_backend_has_the_number_of_requests_of_scipy(klass, period):
+    hour = model_hours("number_of_requests", klass)[period]
+    numpy_distribution, scipy_distribution = model_distributions("number_of_requests", klass, hour)
+    samples = numpy_distribution.rvs(size=5 * DRAWS, random_state=np.random.default_rng(1))
+    assert abs(samples.mean() - scipy_distribution.mean()) < 5 * np.sqrt(scipy_distribution.var() / samples.size)
+    assert samples.var() == pytest.approx(scipy_distribution.var(), rel=0.2)
+
+
+def test_scipy_backend_reproduces_the_previous_traffic(monkeypatch):
+    monkeypatch.setattr(generator, "MAX_IAT_RESAMPLING_ATTEMPTS", PRODUCTION_MAX_IAT_RESAMPLING_ATTEMPTS)
+    iat_sampler = generator.IATSampler("rejection")
+    checksum = hashlib.sha256()
+    for uid in SCIPY_USERS:
+        user = generator.User(uid, generator.USER_CLASSES[uid % len(generator.USER_CLASSES)], DAY, iat_sampler, "scipy")
+        user.generate_synthetic_traffic(generator.user_random_state(uid, SEED))
+        traffic = user.traffic()
+        checksum.update(np.ascontiguousarray(traffic.timestamp).tobytes())
+        checksum.update(np.ascontiguousarray(traffic.volume).tobytes())
+    assert iat_sampler.rejected_hours > 0
+    assert checksum.hexdigest() == SCIPY_USERS_SHA256
+
+
+def test_scipy_backend_reproduces_the_previous_engine_traffic():
+    iat_sampler = generator.IATSampler("rejection", SCIPY_ENGINE_MAX_IAT_RESAMPLING_ATTEMPTS)
+    uids = np.arange(300, dtype=np.int64)
+    klasses = (uids % len(generator.USER_CLASSES)).astype(np.int8)
+    traffic = generator.PopulationEngine(uids, klasses, DAY, SEED, iat_sampler, "scipy").generate()
+    assert iat_sampler.truncated_hours > 0
+    assert traffic_sha256(traffic) == SCIPY_ENGINE_SHA256
+
+
+class ConstantDistribution(object):
+    # Every IAT is 'value' seconds, whatever the random state
+    def __init__(self, value):
+        self.value = value
+
+    def rvs(self, size=None, random_state=None):
+        return np.full(size, self.value)
+
+
+@pytest.mark.parametrize("method, batch_size", (("rejection", None), ("batched", 2), ("batched", 64)))
+def test_iat_sampler_counters_of_the_resampling_methods(method, batch_size):
+    # The users with 2 and 3 requests never fit, they are resampled max_attempts + 1 times whatever the method, then
+    # the requests beyond the hour are removed
+    iat_sampler = generator.IATSampler(method, 3, *([batch_size] if batch_size else []))
+    arrival_times, counts = iat_sampler.sample(ConstantDistribution(2000.0), [0, 1, 2, 3])
+    assert counts.tolist() == [0, 1, 1, 1]
+    assert arrival_times.tolist() == [2000.0, 2000.0, 2000.0]
+    assert iat_sampler.counters() == {
+        "attempts": 3 + 2 * 4,
+        "rejected_hours": 2,
+        "scaled_hours": 0,
+        "truncated_hours": 2,
+        "truncated_requests": 3,
+    }
+
+
+def test_iat_sampler_counters_of_the_scaled_method():
+    iat_sampler = generator.IATSampler("scaled")
+    arrival_times, counts = iat_sampler.sample(ConstantDistribution(2000.0), [0, 1, 2, 3])
+    assert counts.tolist() == [0, 1, 2, 3]
+    assert arrival_times == pytest.approx([2000.0, 1800.0, 3600.0, 1200.0, 2400.0, 3600.0])
+    assert iat_sampler.counters() == {
+        "attempts": 3,
+        "rejected_hours": 2,
+        "scaled_hours": 2,
+        "truncated_hours": 0,
+        "truncated_requests": 0,
+    }
+
+
+def test_scaled_iat_sampler_never_truncates():
+    # 20 IATs of 180 seconds on average overflow the hour about half of the time
+    iat_sampler = generator.IATSampler("scaled")
+    counts = np.random.default_rng(1).integers(0, 40, 5000)
+    arrival_times, kept_counts = iat_sampler.sample(NumpyGamma(1.0, 0.0, 180.0), counts, np.random.default_rng(2))
+    assert np.array_equal(kept_counts, counts)
+    assert arrival_times.size == counts.sum() and arrival_times.max() <= generator.ONE_HOUR
+    assert iat_sampler.scaled_hours == iat_sampler.rejected_hours > 0
+    assert iat_sampler.truncated_hours == iat_sampler.truncated_requests == 0
+
+
+def test_batched_iat_sampler_has_the_distribution_of_rejection():
+    counts = np.full(5000, 20)
+    sampled = {}
+    for method in ("rejection", "batched"):
+        iat_sampler = generator.IATSampler(method)
+        sampled[method] = iat_sampler.sample(NumpyGamma(1.0, 0.0, 180.0), counts, np.random.default_rng(1))
+        assert iat_sampler.rejected_hours > 1000
+        assert iat_sampler.truncated_hours == 0
+    (rejection_times, rejection_counts), (batched_times, batched_counts) = sampled["rejection"], sampled["batched"]
+    assert np.array_equal(rejection_counts, batched_counts)
+    # The arrival times within the hour, and the arrival time of the last request of every user
+    assert stats.ks_2samp(rejection_times, batched_times).pvalue > 0.001
+    assert stats.ks_2samp(rejection_times[19::20], batched_times[19::20]).pvalue > 0.001
@@ -0,0 +1,78 @@
+import json
+from datetime import datetime
+from glob import glob
+from os import path, stat
+
+import pytest
+
+import horizon
+from output import file_sha256
+
+START_DATE = "2013-08-25"
+
+
+def horizon_files(output_directory) -> dict:
+    # Digest of every shard and content of every checkpoint of the horizon
+    files = {}
+    for shard_path in glob(path.join(output_directory, "day-*", "*.npy")):
+        files[path.relpath(shard_path, output_directory)] = file_sha256(shard_path)
+    for checkpoint_path in glob(path.join(output_directory, "checkpoint-*.json")):
+        with open(checkpoint_path) as checkpoint_file:
+            files[path.basename(checkpoint_path)] = json.load(checkpoint_file)
+    return files
+
+
+def generate(output_directory, **options):
+    # 300 users over 3 days, in 3 shards generated one after the other
+    options = dict(
+        dict(number_of_users=300, number_of_days=3, start_date=START_DATE, number_of_workers=1, users_per_shard=100),
+        **options,
+    )
+    horizon.generate_horizon(output_directory=str(output_directory), **options)
+
+
+def test_a_resumed_horizon_is_the_uninterrupted_one(tmp_path, monkeypatch):
+    generate(tmp_path / "uninterrupted")
+    expected = horizon_files(tmp_path / "uninterrupted")
+    assert len(expected) == 3 * 3 + 3
+
+    # The second day of the second shard fails, after its first day was written and checkpointed
+    population_engine = horizon.PopulationEngine
+
+    def failing_engine(uids, klasses, day_date, *arguments):
+        if uids[0] == 100 and day_date == datetime(2013, 8, 26):
+            raise Exception("Crash")
+        return population_engine(uids, klasses, day_date, *arguments)
+
+    monkeypatch.setattr(horizon, "PopulationEngine", failing_engine)
+    with pytest.raises(Exception, match="Crash"):
+        generate(tmp_path / "resumed")
+    interrupted = horizon_files(tmp_path / "resumed")
+    assert interrupted["checkpoint-00001.json"]["completed_days"] == 1
+    assert "day-0001/traffic-00001.npy" not in interrupted and "checkpoint-00002.json" not in interrupted
+
+    monkeypatch.setattr(horizon, "PopulationEngine", population_engine)
+    completed_day = path.join(str(tmp_path / "resumed"), "day-0000", "traffic-00001.npy")
+    completed_day_mtime = stat(completed_day).st_mtime_ns
+    # The start date is read back from the manifest of the horizon
+    generate(tmp_path / "resumed", start_date=None)
+    assert stat(completed_day).st_mtime_ns == completed_day_mtime
+    assert horizon_files(tmp_path / "resumed") == expected
+
+
+@pytest.mark.parametrize(
+    "options",
+    (
+        {"number_of_users": 400},
+        {"number_of_days": 4},
+        {"start_date": "2013-08-26"},
+        {"users_per_shard": 50},
+        {"random_seed": 1},
+        {"iat_sampling_method": "scaled"},
+        {"sampling_backend": "scipy"},
+    ),
+)
+def test_a_horizon_is_not_resumed_with_other_parameters(tmp_path, options):
+    generate(tmp_path)
+    with pytest.raises(Exception, match="holds a horizon generated with other parameters"):
+        generate(tmp_path, **options)
@@ -0,0 +1,53 @@
+from datetime import datetime
+from glob import glob
+from os import path
+
+import numpy as np
+import pytest
+
+import generator
+from output import load_traffic, time_ordered_records
+
+DAY = datetime(2013, 8, 25)
+
+
+def test_time_ordered_records_are_the_sorted_shards(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generator.generate_synthethic_users_and_traffic(
+        500, 2, output_format="npy", initial_timestamp_date=DAY, users_per_shard=100
+    )
+    shard_records = load_traffic(path.join(generator.USERS_DIRECTORY, generator.COLUMNAR_DIRECTORY))
+    records = np.concatenate(shard_records)
+    windows = list(time_ordered_records(shard_records, 100))
+    assert len(windows) > 1
+    assert np.array_equal(np.concatenate(windows), records[np.lexsort((records["uid"], records["timestamp"]))])
+
+
+def test_unsorted_shards_are_refused(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generator.generate_synthethic_users_and_traffic(500, 2, output_format="npy", initial_timestamp_date=DAY)
+    columnar_directory = path.join(generator.USERS_DIRECTORY, generator.COLUMNAR_DIRECTORY)
+    shard_records = [np.array(shard) for shard in load_traffic(columnar_directory)]
+    shard_records[-1]["timestamp"][[10, -10]] = shard_records[-1]["timestamp"][[-10, 10]]
+    with pytest.raises(Exception, match="shard %d is not sorted" % (len(shard_records) - 1)):
+        list(time_ordered_records(shard_records, 100))
+
+
+def test_a_rerun_with_fewer_users_loads_only_its_shards(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    columnar_directory = path.join(generator.USERS_DIRECTORY, generator.COLUMNAR_DIRECTORY)
+    for number_of_users in (500, 250):
+        generator.generate_synthethic_users_and_traffic(
+            number_of_users, 2, output_format="npy", initial_timestamp_date=DAY, users_per_shard=100
+        )
+    # Neither the shards nor the manifest of the first run are left, and a file no manifest lists is not loaded
+    assert sorted(path.basename(file_path) for file_path in glob(path.join(columnar_directory, "*"))) == [
+        "manifest-0000000000-0000000250.json",
+        "traffic-00000.npy",
+        "traffic-00001.npy",
+        "traffic-00002.npy",
+    ]
+    np.save(path.join(columnar_directory, "traffic-00099.npy"), load_traffic(columnar_directory)[0])
+    records = np.concatenate(load_traffic(columnar_directory))
+    assert len(load_traffic(columnar_directory)) == 3
+    assert records["uid"].max() < 250
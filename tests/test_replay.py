@@ -0,0 +1,197 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+import replay
+from generator import SyntheticTraffic
+
+RESET = b"reset"
+
+
+class Endpoint(object):
+    """Local HTTP endpoint answering the requests with 'responses' in turn, closing the connection after the ones
+    that ask for it, or resetting it for RESET."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.connections = 0
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while self.responses:
+                headers = await reader.readuntil(b"\r\n\r\n")
+                length = headers.lower().split(b"content-length:")[1].split(b"\r\n")[0]
+                await reader.readexactly(int(length))
+                self.requests += 1
+                response = self.responses.pop(0)
+                if response == RESET:
+                    writer.transport.abort()
+                    return
+                writer.write(response)
+                await writer.drain()
+                if b"Connection: close" in response or response.startswith(b"HTTP/1.0"):
+                    writer.close()
+                    return
+        except asyncio.IncompleteReadError:
+            pass
+
+
+async def send_all(sink, number_of_payloads):
+    # Sends the payloads one after the other, returns the exception raised by each send, or None
+    await sink.open()
+    errors = []
+    for _ in range(number_of_payloads):
+        try:
+            await asyncio.wait_for(sink.send(memoryview(b"x" * 10)), 5)
+            errors.append(None)
+        except Exception as exception:
+            errors.append(exception)
+    await sink.close()
+    return errors
+
+
+def exchange_with(responses):
+    async def run():
+        endpoint = Endpoint(responses)
+        server = await asyncio.start_server(endpoint.handle, "127.0.0.1", 0)
+        sink = replay.HTTPSink("127.0.0.1", server.sockets[0].getsockname()[1], number_of_connections=1)
+        errors = await send_all(sink, len(responses))
+        server.close()
+        await server.wait_closed()
+        return endpoint, errors
+
+    return asyncio.run(run())
+
+
+def test_http_sink_reads_every_kind_of_response_on_one_connection():
+    endpoint, errors = exchange_with(
+        [
+            b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok",
+            b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n"
+            b"2\r\nok\r\n3;name=value\r\nabc\r\n0\r\nTrailer: 1\r\n\r\n",
+            b"HTTP/1.1 204 No Content\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n",
+        ]
+    )
+    assert errors == [None] * 4
+    assert endpoint.requests == 4 and endpoint.connections == 1
+
+
+def test_http_sink_replaces_the_connections_closed_or_broken():
+    endpoint, errors = exchange_with(
+        [
+            b"HTTP/1.1 200 OK\r\nConnection: close\r\n\r\nbody up to the end of the connection",
+            b"HTTP/1.0 200 OK\r\nContent-Length: 0\r\n\r\n",
+            RESET,
+            b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\n\r\n",
+            b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok",
+        ]
+    )
+    assert [error is None for error in errors] == [True, True, False, False, True]
+    assert "500" in str(errors[3])
+    assert endpoint.requests == 5 and endpoint.connections == 5
+
+
+class FailingTCPSink(replay.TCPSink):
+    # The first exchanges fail as a reset connection does
+    def __init__(self, host, port, failures):
+        replay.TCPSink.__init__(self, host, port, 1)
+        self.failures = failures
+
+    async def exchange(self, reader, writer, payload):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionResetError()
+        return await replay.TCPSink.exchange(self, reader, writer, payload)
+
+
+def test_tcp_sink_replaces_a_connection_after_an_error():
+    async def run():
+        received = []
+        connections = []
+
+        async def handle(reader, writer):
+            connections.append(writer)
+            received.append(await reader.read())
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        errors = await send_all(FailingTCPSink("127.0.0.1", server.sockets[0].getsockname()[1], 2), 4)
+        await asyncio.sleep(0.1)
+        server.close()
+        await server.wait_closed()
+        return errors, connections, received
+
+    errors, connections, received = asyncio.run(run())
+    assert [type(error) for error in errors] == [ConnectionResetError, ConnectionResetError, type(None), type(None)]
+    # The first connection, then one per failure, only the last one received the payloads
+    assert len(connections) == 3
+    assert received == [b"", b"", b"x" * 20]
+
+
+@pytest.mark.parametrize("protocol", ("tcp", "http", "udp", "memory"))
+def test_create_sink(protocol):
+    assert type(replay.create_sink(protocol, "127.0.0.1", 8080)).__name__.lower().startswith(protocol)
+
+
+def traffic_batches(timestamps, volumes, batch_size):
+    # The sessions in batches of batch_size, as chronological_traffic hands them to the replay, after an empty batch
+    timestamps, volumes = np.asarray(timestamps, dtype=np.float64), np.asarray(volumes, dtype=np.float64)
+    yield SyntheticTraffic(*(np.empty(0) for _ in SyntheticTraffic._fields))
+    for start in range(0, timestamps.size, batch_size):
+        end = start + batch_size
+        uids = np.arange(start, min(end, timestamps.size), dtype=np.int64)
+        yield SyntheticTraffic(uids, timestamps[start:end], volumes[start:end], np.zeros(uids.size, dtype=np.int8))
+
+
+class RecordingSink(replay.MemorySink):
+    # Records the size of every payload in the order they are sent, and the most sessions ever sent at once
+    def __init__(self, delay=0.0):
+        replay.MemorySink.__init__(self, delay)
+        self.sizes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send(self, payload):
+        self.sizes.append(len(payload))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await replay.MemorySink.send(self, payload)
+        finally:
+            self.in_flight -= 1
+
+
+def test_replay_sends_every_session_in_timestamp_order():
+    # Sessions of increasing volume, starting an hour into the day, the last ones above the largest payload
+    timestamps = 3600 + np.linspace(0.0, 1.0, 50)
+    volumes = np.arange(1, 51) * 0.5
+    sink = RecordingSink()
+    report = replay.replay(traffic_batches(timestamps, volumes, 7), sink, 100.0, max_payload_size=20000)
+    sizes = np.minimum((volumes * replay.BYTES_PER_KILOBYTE).astype(int), 20000)
+    assert report["requests"] == sink.requests == 50 and report["failures"] == 0
+    assert report["bytes"] == sink.bytes == sizes.sum()
+    assert sink.sizes == sizes.tolist()
+
+
+def test_replay_speedup_sets_the_elapsed_time():
+    # 2 seconds of traffic, replayed in 0.2 and 0.04 seconds
+    timestamps = np.linspace(0.0, 2.0, 21)
+    elapsed = {}
+    for speedup in (10.0, 50.0):
+        report = replay.replay(traffic_batches(timestamps, np.ones(21), 5), replay.MemorySink(), speedup)
+        elapsed[speedup] = report["elapsed_seconds"]
+    assert elapsed[10.0] == pytest.approx(0.2, abs=0.05)
+    assert elapsed[50.0] == pytest.approx(0.04, abs=0.05)
+    assert elapsed[10.0] > elapsed[50.0]
+
+
+def test_replay_bounds_the_sessions_in_flight():
+    # Every session is due at once, the sink takes 10 ms for each
+    sink = RecordingSink(delay=0.01)
+    report = replay.replay(traffic_batches(np.zeros(30), np.ones(30), 10), sink, max_concurrent_sessions=4)
+    assert report["requests"] == 30
+    assert sink.max_in_flight == 4
+    assert report["max_session_wait_seconds"] > 0
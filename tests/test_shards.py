@@ -0,0 +1,46 @@
+from datetime import datetime
+
+import pytest
+
+import generator
+import shards
+
+DAY = datetime(2013, 8, 25)
+
+
+def generate_merged_trace(directory, monkeypatch, shard_count=None, **options) -> dict:
+    # Generates 500 users in 'directory', on a single node or as shard_count shards in host-N subdirectories, and
+    # merges their shards
+    host_directories = []
+    for shard_index in range(shard_count or 1):
+        host_directory = directory / ("host-%d" % shard_index)
+        host_directory.mkdir(parents=True)
+        monkeypatch.chdir(host_directory)
+        options.update(output_format="npy", initial_timestamp_date=DAY, number_of_workers=2, users_per_shard=100)
+        if shard_count:
+            generator.generate_shard(500, shard_index, shard_count, **options)
+        else:
+            generator.generate_synthethic_users_and_traffic(500, **options)
+        host_directories.append(str(host_directory / generator.USERS_DIRECTORY / generator.COLUMNAR_DIRECTORY))
+    return shards.merge_shards(host_directories, str(directory / "merged.npy"))
+
+
+def test_sharded_generation_merges_into_the_single_node_trace(tmp_path, monkeypatch):
+    single_node = generate_merged_trace(tmp_path / "single", monkeypatch)
+    sharded = generate_merged_trace(tmp_path / "sharded", monkeypatch, 3)
+    assert sharded["shards"] > single_node["shards"]
+    assert sharded["requests"] == single_node["requests"] > 0
+    assert sharded["sha256"] == single_node["sha256"]
+
+
+
+def test_missing_users_are_refused(tmp_path, monkeypatch):
+    host_directories = []
+    for shard_index in (0, 2):
+        host_directory = tmp_path / ("host-%d" % shard_index)
+        host_directory.mkdir()
+        monkeypatch.chdir(host_directory)
+        generator.generate_shard(300, shard_index, 3, output_format="npy", initial_timestamp_date=DAY)
+        host_directories.append(str(host_directory / generator.USERS_DIRECTORY / generator.COLUMNAR_DIRECTORY))
+    with pytest.raises(Exception, match="The users from 100 to 200 are missing or duplicated"):
+        shards.merge_shards(host_directories, str(tmp_path / "merged.npy"))
@@ -0,0 +1,34 @@
+from datetime import datetime
+from os import path
+
+import numpy as np
+
+import generator
+from output import load_traffic
+from trace_index import Trace
+
+DAY = datetime(2013, 8, 25)
+
+
+def test_trace_index_windows_are_the_brute_force_ones(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    generator.generate_synthethic_users_and_traffic(
+        500, 2, output_format="npy", initial_timestamp_date=DAY, time_index=True, users_per_shard=100
+    )
+    records = np.concatenate(load_traffic(path.join(generator.USERS_DIRECTORY, generator.COLUMNAR_DIRECTORY)))
+    records = records[np.lexsort((records["uid"], records["timestamp"]))]
+    trace = Trace(path.join(generator.USERS_DIRECTORY, generator.TRACE_DIRECTORY))
+    assert len(trace.records) == len(records)
+    for start, end, klasses in (
+        ("2013-08-25T00:00", "2013-08-26T00:00", None),
+        ("2013-08-25T18:00", "2013-08-25T19:00", None),
+        ("2013-08-25T09:59:30.5", "2013-08-25T10:01:15", ["HF", "LO"]),
+        ("2013-08-25T12:00:07", "2013-08-25T12:00:07", None),
+        ("2013-08-24T00:00", "2013-08-25T00:30", ["MO"]),
+    ):
+        start_time, end_time = np.datetime64(start, "us"), np.datetime64(end, "us")
+        selected = (records["timestamp"] >= start_time) & (records["timestamp"] < end_time)
+        if klasses:
+            selected &= np.isin(records["klass"], [generator.USER_CLASSES.index(klass) for klass in klasses])
+        assert np.array_equal(trace.window(start, end, klasses), records[selected])
+
@@ -0,0 +1,131 @@
+# Synthetic Traffic Generator, Version 0.1
+# (c) 2015-2015, Inria, Palaiseau, France
+# Licensed under the GNU GPL, Version 3. For more details see LICENSE
+# Author: Eduardo Mucelli Rezende Oliveira (edumucelli@gmail.com)
+
+import json
+import sys
+from os import makedirs, path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from generator import USER_CLASSES
+from output import TRAFFIC_RECORD, load_traffic, time_ordered_records
+
+TRACE_FILE = "trace.npy"
+INDEX_FILE = "index.npy"
+INDEX_DESCRIPTION_FILE = "index.json"
+# Width of the time buckets of the index
+INDEX_RESOLUTION = np.timedelta64(60, "s")
+# Records sorted at once while building the trace, on average
+BUILD_WINDOW_RECORDS = 1 << 22
+
+
+def build_trace(shards: List[np.ndarray], directory, resolution=INDEX_RESOLUTION) -> Dict:
+    """Writes the records of 'shards', each one sorted by timestamp, as a single memory-mappable npy trace grouped by
+    class, and by timestamp then uid within a class, along with its index. For every class and every bucket of
+    'resolution' since the first one of the trace, the index holds the row of the first record at or after the
+    start of the bucket, thus the records of a class within a time window are one contiguous slice of the trace."""
+    makedirs(directory, exist_ok=True)
+    records_per_class = np.zeros(len(USER_CLASSES), dtype=np.int64)
+    for shard in shards:
+        records_per_class += np.bincount(shard["klass"], minlength=len(USER_CLASSES))
+    class_offsets = np.concatenate(([0], np.cumsum(records_per_class)))
+    trace = np.lib.format.open_memmap(
+        path.join(directory, TRACE_FILE), mode="w+", dtype=TRAFFIC_RECORD, shape=(int(class_offsets[-1]),)
+    )
+    # Windows arrive in time order, the records of each class are appended after the ones of the previous windows
+    positions = class_offsets[:-1].copy()
+    first, last = None, None
+    for records in time_ordered_records(shards, BUILD_WINDOW_RECORDS):
+        if first is None:
+            first = records["timestamp"][0]
+        last = records["timestamp"][-1]
+        records = records[np.argsort(records["klass"], kind="stable")]
+        bounds = np.searchsorted(records["klass"], np.arange(len(USER_CLASSES) + 1))
+        for code in range(len(USER_CLASSES)):
+            count = bounds[code + 1] - bounds[code]
+            trace[positions[code] : positions[code] + count] = records[bounds[code] : bounds[code + 1]]
+            positions[code] += count
+    if first is None:
+        first = last = np.datetime64(0, "us")
+
+    origin = first - (first - np.datetime64(0, "us")) % resolution
+    number_of_buckets = int((last - origin) // resolution) + 1
+    bucket_starts = origin + np.arange(number_of_buckets + 1) * resolution
+    index = np.empty((len(USER_CLASSES), number_of_buckets + 1), dtype=np.int64)
+    for code in range(len(USER_CLASSES)):
+        class_timestamps = trace["timestamp"][class_offsets[code] : class_offsets[code + 1]]
+        index[code] = class_offsets[code] + np.searchsorted(class_timestamps, bucket_starts)
+    trace.flush()
+    del trace
+    np.save(path.join(directory, INDEX_FILE), index)
+
+    description = {
+        "origin": str(origin),
+        "resolution_seconds": int(resolution / np.timedelta64(1, "s")),
+        "buckets": number_of_buckets,
+        "user_classes": list(USER_CLASSES),
+        "records": int(class_offsets[-1]),
+    }
+    with open(path.join(directory, INDEX_DESCRIPTION_FILE), "w") as description_file:
+        json.dump(description, description_file, indent=2)
+    return description
+
+
+class Trace(object):
+    """Indexed trace written by build_trace. The trace is memory-mapped, and a query only reads the rows of its
+    window, found with the index, and a few pages around them."""
+
+    def __init__(self, directory):
+        with open(path.join(directory, INDEX_DESCRIPTION_FILE)) as description_file:
+            description = json.load(description_file)
+        self.user_classes = description["user_classes"]
+        self.origin = np.datetime64(description["origin"], "us")
+        self.resolution = np.timedelta64(description["resolution_seconds"], "s")
+        self.records = np.load(path.join(directory, TRACE_FILE), mmap_mode="r")
+        self.index = np.load(path.join(directory, INDEX_FILE))
+
+    def bucket(self, timestamp) -> int:
+        # Bucket of the timestamp, clipped to the ones of the index
+        return int(np.clip((timestamp - self.origin) // self.resolution, 0, self.index.shape[1] - 1))
+
+    def rows(self, start, end, klass) -> slice:
+        # Rows of the requests of the class from start (included) to end (excluded)
+        code = self.user_classes.index(klass)
+        first = self.index[code, self.bucket(start)]
+        last = self.index[code, min(self.bucket(end) + 1, self.index.shape[1] - 1)]
+        # Within the buckets of the window, the exact bounds are searched in their rows only
+        timestamps = self.records["timestamp"][first:last]
+        return slice(first + np.searchsorted(timestamps, start), first + np.searchsorted(timestamps, end))
+
+    def window(self, start, end, klasses: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Requests from start (included) to end (excluded), datetimes or anything numpy.datetime64 accepts, e.g.,
+        '2013-08-25T18:00', of the given classes, all by default, as TRAFFIC_RECORD ordered by timestamp, then uid."""
+        start, end = np.datetime64(start, "us"), np.datetime64(end, "us")
+        records = np.concatenate(
+            [self.records[self.rows(start, end, klass)] for klass in (klasses if klasses else self.user_classes)]
+        )
+        return records[np.lexsort((records["uid"], records["timestamp"]))]
+
+
+if __name__ == "__main__":
+    # python trace_index.py build <trace directory> <npy trace or shard directory> [...]
+    # python trace_index.py query <trace directory> <start> <end> [class ...]
+    if len(sys.argv) > 3 and sys.argv[1] == "build":
+        shards = []
+        for source in sys.argv[3:]:
+            shards.extend(load_traffic(source) if path.isdir(source) else [np.load(source, mmap_mode="r")])
+        index_description = build_trace(shards, sys.argv[2])
+        print("[+] Indexed %d requests in '%s'" % (index_description["records"], sys.argv[2]))
+    elif len(sys.argv) > 4 and sys.argv[1] == "query":
+        for record in Trace(sys.argv[2]).window(sys.argv[3], sys.argv[4], sys.argv[5:]).tolist():
+            timestamp, uid, volume, klass = record
+            print("%s %s %s %s" % (timestamp.strftime("%Y-%m-%d %H:%M:%S"), uid, volume, USER_CLASSES[klass]))
+    else:
+        print(
+            "Usage: python trace_index.py build <trace directory> <npy trace or shard directory> [...]\n"
+            "       python trace_index.py query <trace directory> <start> <end> [class ...]"
+        )
+        sys.exit(1)